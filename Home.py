@@ -1,69 +1,18 @@
 import streamlit as st
-import re
-from cb_model import get_cb_recommendations
-from urllib.parse import quote
-# -----------------------------
-# Helper functions
-# -----------------------------
-def format_description(desc: str) -> str:
-    if not desc or not isinstance(desc, str):
-        return "No description available."
-    desc = " ".join(desc.strip().split())
-    if not desc:
-        return "No description available."
-    desc = desc[0].upper() + desc[1:]
-    if desc and desc[-1] not in ".!?":
-         desc += "."
-    sentences = []
-    current = ""
-    words = desc.split()
-    for i, word in enumerate(words):
-        current += word + " "
-        next_word = words[i + 1] if i < len(words) - 1 else ""
-        if (word.endswith(('.', '!', '?')) or
-             (next_word and next_word[0].isupper() and len(current.split()) > 8)):
-             sentence = current.strip()
-             if sentence and not sentence[-1] in '.!?':
-                 sentence += '.'
-             sentences.append(sentence)
-             current = ""
-
-    if current.strip():
-        last_sentence = current.strip()
-        if not last_sentence[-1] in '.!?':
-            last_sentence += '.'
-        sentences.append(last_sentence)
-
-    formatted_desc = " ".join(sentences)
-    formatted_desc = re.sub(r'\s+([.,!?])', r'\1', formatted_desc)  # Remove space before punctuation
-    formatted_desc = re.sub(r'([.,!?])([A-Za-z])', r'\1 \2', formatted_desc)  # Add space after punctuation
-    formatted_desc = re.sub(r'\s+', ' ', formatted_desc)  # Remove extra spaces
-    return formatted_desc
-
-
-def format_title(title: str) -> str:
-    """Convert title to proper case while preserving acronyms and special words."""
-    if not title or not isinstance(title, str):
-        return "N/A"
-    # Remove trailing period and strip whitespace
-    title = title.strip().rstrip('.')
-    # Common anime/manga words that should stay capitalized
-    special_words = {'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X'}
-    words = title.split()
-    formatted_words = []
-    for i, word in enumerate(words):
-        if word.upper() in special_words or (len(word) > 1 and word.isupper()):
-            # Preserve acronyms and Roman numerals
-            formatted_words.append(word)
-        else:
-            # Capitalize first letter, lowercase the rest
-            formatted_words.append(word[0].upper() + word[1:].lower())
-    return ' '.join(formatted_words)
-
+from cb_model import (add_reload_listener, next_cb_recommendations, relations_available, start_artifact_watcher,
+                      stream_cb_recommendations)
+from cb_results import RecommendationError
+from cb_warmup import start_warmup, warm_up
+from card_render import clear_card_cache, render_row
 # -----------------------------
 # Page setup
 # -----------------------------
 st.set_page_config(page_title="AniSense", layout="wide",page_icon="assets/naruto.jpg")
+# Model, result and trailer caches warm up in the background, once per process
+start_warmup()
+# New artifact versions are loaded and warmed in the background, then swapped in
+add_reload_listener("card_cache", lambda model: clear_card_cache())
+start_artifact_watcher(prepare=lambda model: warm_up(model=model))
 st.markdown("""
 <div class="main-header">
     <h1 style='margin:0; color:white; font-size:2.5rem; font-weight:700;'>AniSense : An Anime and Manga Recommender</h1>
@@ -410,6 +359,176 @@ body {
     text-decoration: none;
 }
 
+/* Card grid: one HTML payload per row */
+.card-row {
+    display: grid;
+    gap: 1rem;
+    align-items: start;
+}
+
+.card-meta {
+    margin-top: 8px;
+}
+
+.card-details {
+    margin: 0 0 12px 0;
+    background: rgba(70, 70, 90, 0.9);
+    border-radius: 12px;
+    border: 1px solid rgba(255, 255, 255, 0.2);
+    font-family: 'Inter', sans-serif;
+}
+
+.card-details summary {
+    cursor: pointer;
+    color: #ffffff;
+    font-weight: 700;
+    font-size: 1.1rem;
+    padding: 14px 18px;
+}
+
+.card-details[open] {
+    padding-bottom: 12px;
+}
+
+.alt-titles {
+    padding: 0 16px;
+    color: #f5f5f5;
+}
+
+.tags-panel {
+    margin: 4px 12px;
+    padding: 16px;
+    background: rgba(30, 30, 46, 0.8);
+    border-radius: 15px;
+    border-left: 4px solid #667eea;
+}
+
+.tags-title {
+    font-weight: 700;
+    color: #00d4ff;
+    margin-bottom: 8px;
+    font-size: 1rem;
+}
+
+.tags-list {
+    line-height: 1.8;
+}
+
+.tag-pill {
+    background: linear-gradient(135deg, #667eea, #764ba2);
+    color: white;
+    padding: 6px 14px;
+    border-radius: 20px;
+    font-size: 0.75rem;
+    margin: 2px 6px 4px 0;
+    display: inline-block;
+    border: 1px solid rgba(255,255,255,0.3);
+    box-shadow: 0 3px 10px rgba(102, 126, 234, 0.4);
+    transition: all 0.3s ease;
+    font-weight: 600;
+    cursor: pointer;
+}
+
+.tag-pill:hover {
+    transform: translateY(-3px) scale(1.05);
+    box-shadow: 0 6px 15px rgba(102, 126, 234, 0.6);
+}
+
+.banner-wrap {
+    position: relative;
+    border-radius: 10px;
+    overflow: hidden;
+    margin: 10px 12px 0 12px;
+    min-height: 200px;
+    max-height: 400px;
+}
+
+.banner-img {
+    width: 100%;
+    height: 200px;
+    object-fit: cover;
+    opacity: 0.3;
+    filter: blur(1px);
+}
+
+.banner-overlay {
+    position: absolute;
+    top: 0;
+    left: 0;
+    right: 0;
+    bottom: 0;
+    padding: 20px;
+    background: rgba(0, 0, 0, 0.7);
+    overflow-y: auto;
+}
+
+/* Trailer */
+.trailer-wrap {
+    text-align: center;
+    margin: 20px 0;
+}
+
+.trailer-thumb {
+    position: relative;
+    display: block;
+    border-radius: 12px;
+    overflow: hidden;
+    box-shadow: 0 8px 25px rgba(0,0,0,0.4);
+    transition: all 0.3s ease;
+    text-decoration: none;
+}
+
+.trailer-thumb:hover {
+    transform: scale(1.03);
+    box-shadow: 0 12px 35px rgba(255,107,122,0.3);
+}
+
+.trailer-thumb img {
+    width: 100%;
+    height: auto;
+    border-radius: 12px;
+    display: block;
+}
+
+.trailer-play {
+    position: absolute;
+    top: 50%;
+    left: 50%;
+    transform: translate(-50%, -50%);
+    background: rgba(255,107,122,0.9);
+    border-radius: 50%;
+    width: 60px;
+    height: 60px;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+}
+
+.trailer-fallback {
+    width: 100%;
+    height: 180px;
+    border-radius: 12px;
+    background: linear-gradient(135deg, #ff4c60, #1b1b2f);
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    flex-direction: column;
+    color: #ffffff;
+    font-weight: bold;
+    font-size: 1rem;
+    transition: transform 0.3s;
+    box-shadow: 0 4px 14px rgba(0,0,0,0.3);
+    margin-top: 20px;
+}
+
+.trailer-fallback:hover {
+    transform: scale(1.05);
+}
+
+.trailer-fallback span {
+    margin-top: 8px;
+}
+
 /* Expander header */
 .streamlit-expanderHeader {
     background: rgba(70, 70, 90, 0.9) !important;
@@ -481,201 +600,80 @@ body {
 # Form Inputs
 # -----------------------------
 with st.form("search_form"):
-    query = st.text_input("Enter an anime/manga title:",placeholder="e.g., Naruto, Attack on Titan, One Piece...")
+    query = st.text_input("Enter an anime/manga title or describe what you want:",placeholder="e.g., Naruto, Attack on Titan, dark fantasy revenge...")
     media_type = st.selectbox("Media Type", ["ANIME", "MANGA"])
     top_n = st.slider("Number of recommendations:", 5, 30, 15)
+    # Needs the relation graph artifact; older deployments don't have it
+    hide_related = relations_available() and st.checkbox("Hide other titles of the same franchise",
+                                                         help="Sequels, prequels, spin-offs and adaptations")
+    diversity = st.slider("Diversity:", 0.0, 1.0, 0.0, 0.1,
+                          help="Higher values trade similarity for variety among the recommendations.")
     submitted = st.form_submit_button("Generate Recommendations")
 
 # -----------------------------
 # Display Results
 # -----------------------------
+cols_per_row = 4
+
 if submitted and query:
+    st.session_state.pop("results", None)
+    events = stream_cb_recommendations(query, top_n=top_n, media_type=media_type, text_fallback=True, paginate=True,
+                                       hide_related=hide_related, diversity=diversity)
+    # Only ranking blocks the page; cards render as they are formatted
     with st.spinner("Fetching recommendations..."):
-        recs = get_cb_recommendations(query, top_n=top_n, media_type=media_type)
+        first = next(events)
 
-    if "error" in recs.columns:
-        st.warning(recs.iloc[0]["error"])
+    if first["type"] == "error":
+        st.warning(first["error"])
+    else:
+        if first["mode"] == "text":
+            header = f"No title matched, showing the top {first['count']} titles matching '{query}':"
+        else:
+            header = f"Top {first['count']} recommendations for '{query}':"
+        st.success(header)
+        # One markdown element per row, re-rendered from memoized card HTML as cards and trailers arrive
+        rows = [{"slot": st.empty(), "items": [], "trailers": []}
+                for _ in range(-(-first["count"] // cols_per_row))]
+
+        for event in events:
+            if event["type"] == "card":
+                row = rows[event["rank"] // cols_per_row]
+                row["items"].append(event["item"])
+                row["trailers"].append(None)
+            elif event["type"] == "trailer" and event["trailer_id"]:
+                row = rows[event["rank"] // cols_per_row]
+                row["trailers"][event["rank"] % cols_per_row] = event["trailer_id"]
+            else:
+                continue
+            row["slot"].markdown(render_row(row["items"], row["trailers"], cols_per_row), unsafe_allow_html=True)
+
+        # Kept across reruns so "Load more" only formats the next page of the cached ranking
+        st.session_state["results"] = {
+            "header": header,
+            "items": [item for row in rows for item in row["items"]],
+            "trailers": [trailer for row in rows for trailer in row["trailers"]],
+            "cursor": first["cursor"],
+        }
+elif "results" in st.session_state:
+    results = st.session_state["results"]
+    st.success(results["header"])
+    for start in range(0, len(results["items"]), cols_per_row):
+        st.markdown(render_row(results["items"][start:start + cols_per_row],
+                               results["trailers"][start:start + cols_per_row], cols_per_row),
+                    unsafe_allow_html=True)
+
+results = st.session_state.get("results")
+if results and results["cursor"] and st.button("Load more"):
+    with st.spinner("Fetching more recommendations..."):
+        page = next_cb_recommendations(results["cursor"], page_size=top_n, as_frame=False)
+    if isinstance(page, RecommendationError):
+        results["cursor"] = None
+        st.warning(page.message)
     else:
-        st.success(f"Top {len(recs)} recommendations for '{query}':")
-        cols_per_row = 4
-
-        for i in range(0, len(recs), cols_per_row):
-            row_cols = st.columns(cols_per_row)
-            for j, col in enumerate(row_cols):
-                if i + j >= len(recs):
-                    continue
-                item = recs.iloc[i + j]
-                card_class = "card-anime" if item["fetched_type"].upper() == "ANIME" else "card-manga"
-
-                genres_html = " ".join([f"<span class='badge'>{g.title()}</span>" for g in (item['genres'].split(',') if item['genres'] else [])])
-                studios = item.get("studios", [])
-                studio_links = item.get("studio_links", [])
-                if studio_links:
-                    studio_html = " | ".join([f"<a href='{link}' target='_blank' class='studio-link'>{studio}</a>"
-                                              for studio, link in zip(item.get("studios", []), studio_links)])
-                else:
-                    studio_html = "N/A"
-
-                # Remove all the relations preview logic and just keep this:
-                relations_link = (f'<div class="relation-text" style="text-align: center; margin-top: 10px;">'
-                                  f'<a href="https://anilist.co/{item["fetched_type"].lower()}/{item.get("id", "")}/relations" target="_blank" class="relation-toggle">View All Details →</a></div>')
-
-
-                # Dynamic metadata (anime vs manga)
-                if item["fetched_type"].upper() == "ANIME":
-                    start_date = f"{item['start_date']}" if item[
-                        'start_date'] else "Unknown"
-                    end_date = f"{item['end_date']}" if item[
-                        'end_date'] else "Still airing"
-                    meta_html = f"""
-                        <div class='meta-block'><b>Type / Format:</b> {item['fetched_type'].title()} / {item['format'].title()}</div>
-                        <div class='meta-block'><b>Episodes:</b> {item.get('episodes_display')}</div>
-                        <div class='meta-block'><b>Duration:</b> {item['duration']} min</div>
-                        <div class='meta-block'><b>Studio:</b> {studio_html}</div>
-                        <div class='meta-block'><b>Season:</b> {item['season'].title()}</div>
-                        <div class='meta-block'><b>Country:</b> {item['country'].upper()}</div>
-                        <div class='meta-block'><b>Score:</b> {item['averageScore'] / 10:.1f}/10</div>
-                        <div class='meta-block'><b>Dates:</b> {start_date} → {end_date}</div>
-                        <div class='meta-block'><b>Popularity:</b> {item['popularity']} | <b>Favourites:</b> {item['favourites']}</div>
-                        <div class='meta-block'><b>Source / Status:</b> {item['source'].title()} / {item['status'].title()}</div>
-                        <div class='meta-block'><b>Similarity:</b> {item['similarity_score']}</div>
-                    """
-                else:
-                    start_date = f"{item['start_date']}" if item[
-                        'start_date'] else "Unknown"
-                    end_date = f"{item['end_date']}" if item[
-                        'end_date'] else "Still publishing"
-                    meta_html = f"""
-                        <div class='meta-block'><b>Type / Format:</b> {item['fetched_type'].title()} / {item['format'].title()}</div>
-                        <div class='meta-block'><b>Chapters:</b> {item.get('chapters_display')}</div>
-                        <div class='meta-block'><b>Volumes:</b> {item.get('volumes_display')}</div>
-                        <div class='meta-block'><b>Country:</b> {item['country'].upper()}</div>
-                        <div class='meta-block'><b>Score:</b> {item['averageScore'] / 10:.1f}/10</div>
-                        <div class='meta-block'><b>Dates:</b> {start_date} → {end_date}</div>
-                        <div class='meta-block'><b>Popularity:</b> {item['popularity']} | <b>Favourites:</b> {item['favourites']}</div>
-                        <div class='meta-block'><b>Source / Status:</b> {item['source'].title()} / {item['status'].title()}</div>
-                        <div class='meta-block'><b>Similarity:</b> {item['similarity_score']}</div>
-                    """
-
-                with col:
-                    # Display the card
-                    st.markdown(f"""
-                    <div class='card {card_class}'>
-                        <img class='cover' src="{item['coverImage']}" alt="cover">
-                        <h3 style='margin:10px 0;'>
-                           <a href='https://anilist.co/{item["fetched_type"].lower()}/{item.get("id", "")}' target='_blank' style='color:#ffffff; text-decoration:none;'>
-                                {item['display_title'].title().rstrip('.')}
-                            </a>
-                        </h3>
-                        {genres_html}
-                        <div style='margin-top:8px;'>{meta_html}</div>
-                        {relations_link}
-                    </div>
-                    """, unsafe_allow_html=True)
-
-                    with st.expander("Description"):
-                        alt_titles = []
-                        if item.get('title_romaji') and item['title_romaji'] != item['display_title']:
-                            alt_titles.append(f"Romaji: {format_title(item['title_romaji'].rstrip('.'))}")
-                        if item.get('title_english') and item['title_english'] != item['display_title']:
-                            alt_titles.append(f"English: {format_title(item['title_english'].rstrip('.'))}")
-                        if item.get('title_native') and item['title_native'] != item['display_title']:
-                            alt_titles.append(f"Native: {format_title(item['title_native'].rstrip('.'))}")
-                        if alt_titles:
-                            st.markdown(f"**Alternative Titles:** {', '.join(alt_titles)}")
-                        if item.get('tags'):
-                            tags_list = [tag.strip() for tag in item['tags'].split(' ') if tag.strip()]
-                            if tags_list:
-                                limited_tags = tags_list[:10]  # Show more tags
-                                tags_html = " ".join([
-                                    f"<span style='background: linear-gradient(135deg, #667eea, #764ba2); color: white; padding: 6px 14px; border-radius: 20px; font-size: 0.75rem; margin: 2px 6px 4px 0; display: inline-block; border: 1px solid rgba(255,255,255,0.3); box-shadow: 0 3px 10px rgba(102, 126, 234, 0.4); transition: all 0.3s ease; font-weight: 600; cursor: pointer;' onmouseover=\"this.style.transform='translateY(-3px) scale(1.05)'; this.style.boxShadow='0 6px 15px rgba(102, 126, 234, 0.6)'\" onmouseout=\"this.style.transform='translateY(0) scale(1)'; this.style.boxShadow='0 3px 10px rgba(102, 126, 234, 0.4)'\">{tag.title()}</span>"
-                                    for tag in limited_tags])
-                                st.markdown(f"""
-                                <div style='margin: 4px 0; padding: 16px; background: rgba(30, 30, 46, 0.8); border-radius: 15px; border-left: 4px solid #667eea;'>
-                                    <div style='font-weight: 700; color: #00d4ff; margin-bottom: 8px; font-size: 1rem;'>Popular Tags:</div>
-                                    <div style='line-height: 1.8;'>{tags_html}</div>
-                                </div>
-                                """, unsafe_allow_html=True)
-                        banner_bg = f"""
-                            <div style='
-                                position: relative;
-                                border-radius: 10px;
-                                overflow: hidden;
-                                margin-bottom: 10px;
-                                max-height: 400px;
-                            '>
-                                {f'<img src="{item["bannerImage"]}" style="width:100%; height:200px; object-fit:cover; opacity:0.3; filter:blur(1px);" alt="banner">' if item.get("bannerImage") else ''}
-                                <div style='
-                                    position: absolute;
-                                    top: 0;
-                                    left: 0;
-                                    right: 0;
-                                    bottom: 0;
-                                    padding: 20px;
-                                    background: rgba(0, 0, 0, 0.7);
-                                    overflow-y: auto;
-                                '>
-                                    <div class='desc'>{format_description(item.get('description', ''))}</div>
-                                </div>
-                            </div>
-                            """
-                        st.markdown(banner_bg, unsafe_allow_html=True)
-
-                    trailer_url = ""
-                    trailer_id = item.get('trailer_id')
-                    if trailer_id:
-                        trailer_url = f"https://www.youtube.com/watch?v={trailer_id}"
-                    else:
-                        search_query = f"{item['display_title']} official trailer"
-                        trailer_url = f"https://www.youtube.com/results?search_query={quote(search_query)}"
-                    if item["trailer_thumbnail"]:
-                        st.markdown(
-                            f"""
-                            <div style='text-align: center; margin: 20px 0;'>
-                                <a href='{trailer_url}' target='_blank' style='text-decoration: none; display: block;'>
-                                    <div style='position: relative; border-radius: 12px; overflow: hidden; box-shadow: 0 8px 25px rgba(0,0,0,0.4); transition: all 0.3s ease;' 
-                                         onmouseover="this.style.transform='scale(1.03)'; this.style.boxShadow='0 12px 35px rgba(255,107,122,0.3)'" 
-                                         onmouseout="this.style.transform='scale(1)'; this.style.boxShadow='0 8px 25px rgba(0,0,0,0.4)'">
-                                        <img src='{item["trailer_thumbnail"]}' 
-                                             style='width:100%; height:auto; border-radius:12px; display:block;'
-                                             alt='Trailer Thumbnail'>
-                                        <div style='position: absolute; top: 50%; left: 50%; transform: translate(-50%, -50%); background: rgba(255,107,122,0.9); border-radius: 50%; width: 60px; height: 60px; display: flex; align-items: center; justify-content: center;'>
-                                            <svg xmlns="http://www.w3.org/2000/svg" width="30" height="30" fill="white" viewBox="0 0 24 24">
-                                                <path d="M8 5v14l11-7z"/>
-                                            </svg>
-                                        </div>
-                                    </div>
-                                </a>
-                            </div>
-                            """,
-                            unsafe_allow_html=True
-                        )
-                    else:
-                        st.markdown(f"""
-                            <a href='{trailer_url}' target='_blank'>
-                                <div style='
-                                    width:100%; 
-                                    height:180px; 
-                                    border-radius:12px; 
-                                    background: linear-gradient(135deg, #ff4c60, #1b1b2f);
-                                    display:flex; 
-                                    align-items:center; 
-                                    justify-content:center; 
-                                    flex-direction:column;
-                                    color:#ffffff; 
-                                    font-weight:bold; 
-                                    font-size:1rem;
-                                    transition: transform 0.3s;
-                                    box-shadow: 0 4px 14px rgba(0,0,0,0.3);
-                                    margin-top: 20px;
-                                ' onmouseover="this.style.transform='scale(1.05)'" onmouseout="this.style.transform='scale(1.0)'">
-                                    <svg xmlns="http://www.w3.org/2000/svg" width="46" height="46" fill="white" viewBox="0 0 24 24">
-                                        <path d="M3 22V2l18 10-18 10z"/>
-                                    </svg>
-                                    <span style='margin-top:8px;'>Trailer Thumbnail Not Available</span>
-                                </div>
-                            </a>
-                        """, unsafe_allow_html=True)
+        results["items"] += page.items
+        results["trailers"] += [item.trailer_id for item in page]
+        results["cursor"] = page.cursor
+        st.rerun()
 
 # -----------------------------
 # Footer
@@ -0,0 +1,83 @@
+"""
+Build cost of the lexical similarity: densified TF-IDF product vs sparse top-K.
+
+    python benchmarks/bench_lexical.py --sizes 4000,8000,20000 --top-k 500
+
+"dense" is the notebook's ``(mat * mat.T).toarray()``; "sparse" is
+``cb_fusion.lexical_similarity`` (row blocks, pruned to the top-K per row).
+Peak memory is measured with tracemalloc. ``top30_overlap`` is the share of
+each row's top 30 fused neighbours (default weights, no recency) that
+survives the pruning. The shipped build keeps the exact term; this measures
+the trade-off for a future top-K fused artifact. Its embeddings are an SVD
+of the same TF-IDF matrix, so that, as with real sentence embeddings of the
+same text, the semantic and lexical neighbours are correlated; independent
+random factors would make the lexical term pure noise.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from cb_fusion import FusionComponents, lexical_similarity
+from synthetic import make_catalogue
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, {"seconds": round(seconds, 3), "peak_mb": round(peak / 2 ** 20, 1)}
+
+
+def top_overlap(df, vectorizer, mat, top_k, n_rows=200, k=30, seed=0):
+    from sklearn.decomposition import TruncatedSVD
+
+    embeddings = TruncatedSVD(64, random_state=seed).fit_transform(mat)
+    exact = FusionComponents.build(df, vectorizer, embeddings, recency_weight=0.0)
+    pruned = FusionComponents.build(df, vectorizer, embeddings, recency_weight=0.0, lexical_top_k=top_k)
+    rows = np.random.default_rng(seed).choice(len(df), size=min(n_rows, len(df)), replace=False)
+    a = np.argsort(-exact.fuse(rows), axis=1, kind="stable")[:, 1:k + 1]
+    b = np.argsort(-pruned.fuse(rows), axis=1, kind="stable")[:, 1:k + 1]
+    return round(float(np.mean([len(set(x) & set(y)) / k for x, y in zip(a, b)])), 4)
+
+
+def main(argv=None):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="4000,8000,20000")
+    parser.add_argument("--top-k", type=int, default=500)
+    parser.add_argument("--block-size", type=int, default=256)
+    parser.add_argument("--dense-max", type=int, default=8000, help="skip the dense product above this size")
+    parser.add_argument("--overlap-max", type=int, default=8000, help="skip the overlap check above this size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        df = make_catalogue(size, seed=args.seed)
+        vectorizer = TfidfVectorizer(max_features=5000)
+        mat = vectorizer.fit_transform(df["combined_text"].fillna("").tolist())
+        row = {"size": size, "tfidf_nnz": int(mat.nnz), "top_k": args.top_k}
+        if size <= args.dense_max:
+            _, row["dense"] = measure(lambda: (mat * mat.T).toarray())
+        lex, row["sparse"] = measure(lambda: lexical_similarity(mat, top_k=args.top_k, block_size=args.block_size))
+        row["sparse"]["nnz"] = int(lex.nnz)
+        row["sparse"]["stored_mb"] = round((lex.data.nbytes + lex.indices.nbytes + lex.indptr.nbytes) / 2 ** 20, 1)
+        if size <= args.overlap_max:
+            row["top30_overlap"] = top_overlap(df, vectorizer, mat, args.top_k, seed=args.seed)
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Benchmark the get_cb_recommendations hot path on synthetic catalogues.
+
+    python benchmarks/bench_recommendations.py --sizes 8000,50000,200000 --output bench.jsonl
+
+Each catalogue size is generated once into an artifact directory and then
+measured in a fresh worker process, so peak RSS covers loading and querying
+only. Trailer lookups are stubbed, the run never touches the network.
+Results are written as JSON lines, one per (size, filter) combination.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from cb_fusion import FusionComponents
+from cb_search import TextIndex
+from synthetic import (FactorSimilarity, make_catalogue, make_dense_similarity,
+                       make_factors, make_queries, make_text_queries)
+
+# Query-time fusion variant measured when the catalogue has fusion_components.npz
+REFUSION_WEIGHTS = {"semantic": 0.4, "lexical": 0.4}
+REFUSION_RECENCY = 0.2
+# Relevance/diversity trade-off of the "diversified" mode
+DIVERSITY = 0.3
+
+FILTER_COMBOS = [
+    (None, None),
+    ("ANIME", None),
+    ("MANGA", None),
+    ("MANGA", "ALL"),
+    ("MANGA", "MANGA"),
+    ("MANGA", "NOVEL"),
+    ("MANGA", "ONE_SHOT"),
+]
+
+
+# -----------------------------
+# Artifact generation
+# -----------------------------
+def build_artifacts(size, out_dir, dense_max, seed):
+    """Write pkl / npy / joblib artifacts for one catalogue size."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    df = make_catalogue(size, seed=seed)
+    factors = make_factors(size, seed=seed)
+    df.to_pickle(out_dir / "anime_cb_data.pkl")
+
+    # The runtime only loads the vectorizer, fitting on a sample keeps large builds quick
+    tfidf = TfidfVectorizer(max_features=5000)
+    tfidf.fit(df["combined_text"].iloc[:20000].tolist())
+    joblib.dump(tfidf, out_dir / "tfidf_vectorizer.joblib")
+    TextIndex.build(tfidf, df["combined_text"]).save(out_dir / "tfidf_matrix.npz")
+
+    if size <= dense_max:
+        np.save(out_dir / "fused_sim.npy", make_dense_similarity(factors))
+        kind = "dense"
+        # Component factors for query-time fusion; the factors stand in for the sentence embeddings
+        FusionComponents.build(df, tfidf, factors).save(out_dir / "fusion_components.npz")
+    else:
+        np.save(out_dir / "factors.npy", factors)
+        kind = "factors"
+
+    with open(out_dir / "bench_manifest.json", "w") as f:
+        json.dump({"size": size, "similarity": kind, "seed": seed, "fusion": kind == "dense"}, f, indent=2)
+    return out_dir
+
+
+# -----------------------------
+# Worker: load + query in a clean process
+# -----------------------------
+def _percentiles(values):
+    arr = np.asarray(values) * 1000.0
+    return {
+        "mean_ms": round(float(arr.mean()), 3),
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "max_ms": round(float(arr.max()), 3),
+    }
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def _measure(mode, call, queries, **meta):
+    """
+    Run ``call(query)`` (a traced recommendation call) for every query and
+    return one result row: ``mode`` and ``meta`` plus latency percentiles,
+    per-stage percentiles, throughput and peak RSS.
+    """
+    latencies, stages, errors = [], {}, 0
+    started = time.perf_counter()
+    for q in queries:
+        t0 = time.perf_counter()
+        recs = call(q)
+        latencies.append(time.perf_counter() - t0)
+        if "error" in recs.columns:
+            errors += 1
+        for name, ms in recs.attrs["trace"]["stages_ms"].items():
+            stages.setdefault(name, []).append(ms / 1000.0)
+    wall = time.perf_counter() - started
+    return {
+        "mode": mode,
+        **meta,
+        "queries": len(queries),
+        "errors": errors,
+        "latency": _percentiles(latencies),
+        "stages": {name: _percentiles(values) for name, values in stages.items()},
+        "throughput_qps": round(len(queries) / wall, 3),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def run_worker(artifact_dir, n_queries, top_n, seed):
+    import cb_model
+
+    artifact_dir = Path(artifact_dir)
+    meta = json.load(open(artifact_dir / "bench_manifest.json"))
+    cb_model.ANIME_PKL = str(artifact_dir / "anime_cb_data.pkl")
+    cb_model.SIM_NPY = str(artifact_dir / "fused_sim.npy")
+    cb_model.TFIDF_JOB = str(artifact_dir / "tfidf_vectorizer.joblib")
+    cb_model.FUSION_NPZ = str(artifact_dir / "fusion_components.npz")
+    cb_model.TFIDF_MATRIX_NPZ = str(artifact_dir / "tfidf_matrix.npz")
+
+    if meta["similarity"] == "factors":
+        def load_factor_model(manifest=None):
+            anime_df = pd.read_pickle(cb_model.ANIME_PKL)
+            similarity_matrix = FactorSimilarity(np.load(artifact_dir / "factors.npy"))
+            vectorizer = joblib.load(cb_model.TFIDF_JOB)
+            return anime_df, similarity_matrix, vectorizer
+        cb_model.load_cb_model = load_factor_model
+
+    # Cold load (artifacts plus alias and filter indices), measured once outside of the query loop
+    start = time.perf_counter()
+    model = cb_model.get_cb_model()
+    load_s = time.perf_counter() - start
+    rss_after_load = _peak_rss_mb()
+    catalogue_mb = {k: model.catalogue_report[k] for k in ("before_mb", "after_mb")}
+    queries = make_queries(model.anime_df, n_queries, seed=seed)
+
+    cb_model.get_trailer_id = lambda anilist_id, media_type, save=True, deadline=None: None
+
+    base = {"size": meta["size"], "similarity": meta["similarity"], "top_n": top_n}
+    results = []
+    for media_type, manga_format in FILTER_COMBOS:
+        # Combinations can share a cache key, e.g. ("MANGA", "ALL") and ("MANGA", None); measure the ranking every time
+        model._results.clear()
+        results.append(_measure(
+            "single_seed",
+            lambda q: cb_model.get_cb_recommendations(q, top_n=top_n, media_type=media_type,
+                                                      manga_format=manga_format, trace=True),
+            queries, **base, media_type=media_type, manga_format=manga_format, load_s=round(load_s, 3),
+            rss_after_load_mb=rss_after_load, catalogue_mb=catalogue_mb))
+
+    # Multi-seed: three liked titles and one disliked title per request, no filter
+    seed_sets = [([queries[(k + j) % len(queries)] for j in range(3)], [queries[k - 1]]) for k in range(len(queries))]
+    results.append(_measure(
+        "multi_seed",
+        lambda s: cb_model.get_multi_seed_recommendations(s[0], top_n=top_n, negative_seeds=s[1], trace=True),
+        seed_sets, **base, seeds=3, negative_seeds=1))
+
+    # "Load more": next page from the cached ranking of a paginated query, no filter
+    cursors = [cb_model.get_cb_recommendations(q, top_n=top_n, paginate=True).attrs.get("cursor") for q in queries]
+    cursors = [c for c in cursors if c]
+    if cursors:
+        results.append(_measure("next_page", lambda c: cb_model.next_cb_recommendations(c, trace=True), cursors, **base))
+
+    # Free-text search, with and without the genre/tag rerank
+    text_queries = make_text_queries(n_queries, seed=seed)
+    for rerank in (False, True):
+        results.append(_measure(
+            "text_search",
+            lambda q: cb_model.search_cb_recommendations(q, top_n=top_n, rerank=rerank, trace=True),
+            text_queries, **base, rerank=rerank))
+
+    # Single seed with the MMR diversity stage, no filter
+    results.append(_measure(
+        "diversified",
+        lambda q: cb_model.get_cb_recommendations(q, top_n=top_n, trace=True, diversity=DIVERSITY),
+        queries, **base, diversity=DIVERSITY, pool=cb_model.DIVERSITY_POOL))
+
+    # Single seed re-fused from the components with other weights, no filter
+    if meta.get("fusion"):
+        results.append(_measure(
+            "refused",
+            lambda q: cb_model.get_cb_recommendations(q, top_n=top_n, trace=True, fusion_weights=REFUSION_WEIGHTS,
+                                                      recency_weight=REFUSION_RECENCY),
+            queries, **base, fusion_weights=REFUSION_WEIGHTS, recency_weight=REFUSION_RECENCY))
+    return results
+
+
+# -----------------------------
+# Driver
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="8000,50000,200000", help="comma separated catalogue sizes")
+    parser.add_argument("--queries", type=int, default=10, help="queries per filter combination")
+    parser.add_argument("--top-n", type=int, default=15)
+    parser.add_argument("--dense-max", type=int, default=8000,
+                        help="largest size that gets a dense N×N similarity file; larger sizes use factors")
+    parser.add_argument("--artifact-dir", default=None, help="reuse/keep generated artifacts here")
+    parser.add_argument("--output", default=None, help="JSONL output file (default: stdout)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        for row in run_worker(args.worker, args.queries, args.top_n, args.seed):
+            print(json.dumps(row))
+        return
+
+    base = Path(args.artifact_dir) if args.artifact_dir else Path(tempfile.mkdtemp(prefix="anisense_bench_"))
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+            size_dir = base / f"catalogue_{size}"
+            if not (size_dir / "bench_manifest.json").exists():
+                print(f"Generating synthetic catalogue with {size} titles in {size_dir}", file=sys.stderr)
+                build_artifacts(size, size_dir, args.dense_max, args.seed)
+            print(f"Benchmarking {size} titles...", file=sys.stderr)
+            proc = subprocess.run(
+                [sys.executable, __file__, "--worker", str(size_dir), "--queries", str(args.queries),
+                 "--top-n", str(args.top_n), "--seed", str(args.seed)],
+                cwd=tempfile.gettempdir(), capture_output=True, text=True, check=True,
+                env={**os.environ, "PYTHONPATH": str(ROOT)},
+            )
+            for line in proc.stdout.splitlines():
+                if line.startswith("{"):
+                    out.write(line + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Server-side render cost of the recommendation cards, before and after batching.
+
+    python benchmarks/bench_render.py --cards 30
+
+"legacy" reproduces the per-card markup Home.py emitted before card_render:
+one columns container per row plus up to six markdown/expander elements per
+card, each with its own inline styles. "batched" is card_render.render_row,
+one element per row, measured cold and again with the per-title memo warm.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import card_render
+from card_render import format_description, format_title
+from synthetic import make_catalogue, make_dense_similarity, make_factors
+
+
+def legacy_card_payloads(item):
+    """Element payloads of one card as the pre-batching Home.py built them."""
+    payloads = []
+
+    def emit(markup, **_):
+        payloads.append(markup)
+
+    card_class = "card-anime" if item["fetched_type"].upper() == "ANIME" else "card-manga"
+
+    genres_html = " ".join([f"<span class='badge'>{g.title()}</span>" for g in (item['genres'].split(',') if item['genres'] else [])])
+    studios = item.get("studios", [])
+    studio_links = item.get("studio_links", [])
+    if studio_links:
+        studio_html = " | ".join([f"<a href='{link}' target='_blank' class='studio-link'>{studio}</a>"
+                                  for studio, link in zip(item.get("studios", []), studio_links)])
+    else:
+        studio_html = "N/A"
+
+    # Remove all the relations preview logic and just keep this:
+    relations_link = (f'<div class="relation-text" style="text-align: center; margin-top: 10px;">'
+                      f'<a href="https://anilist.co/{item["fetched_type"].lower()}/{item.get("id", "")}/relations" target="_blank" class="relation-toggle">View All Details →</a></div>')
+
+
+    # Dynamic metadata (anime vs manga)
+    if item["fetched_type"].upper() == "ANIME":
+        start_date = f"{item['start_date']}" if item[
+            'start_date'] else "Unknown"
+        end_date = f"{item['end_date']}" if item[
+            'end_date'] else "Still airing"
+        meta_html = f"""
+            <div class='meta-block'><b>Type / Format:</b> {item['fetched_type'].title()} / {item['format'].title()}</div>
+            <div class='meta-block'><b>Episodes:</b> {item.get('episodes_display')}</div>
+            <div class='meta-block'><b>Duration:</b> {item['duration']} min</div>
+            <div class='meta-block'><b>Studio:</b> {studio_html}</div>
+            <div class='meta-block'><b>Season:</b> {item['season'].title()}</div>
+            <div class='meta-block'><b>Country:</b> {item['country'].upper()}</div>
+            <div class='meta-block'><b>Score:</b> {item['averageScore'] / 10:.1f}/10</div>
+            <div class='meta-block'><b>Dates:</b> {start_date} → {end_date}</div>
+            <div class='meta-block'><b>Popularity:</b> {item['popularity']} | <b>Favourites:</b> {item['favourites']}</div>
+            <div class='meta-block'><b>Source / Status:</b> {item['source'].title()} / {item['status'].title()}</div>
+            <div class='meta-block'><b>Similarity:</b> {item['similarity_score']}</div>
+        """
+    else:
+        start_date = f"{item['start_date']}" if item[
+            'start_date'] else "Unknown"
+        end_date = f"{item['end_date']}" if item[
+            'end_date'] else "Still publishing"
+        meta_html = f"""
+            <div class='meta-block'><b>Type / Format:</b> {item['fetched_type'].title()} / {item['format'].title()}</div>
+            <div class='meta-block'><b>Chapters:</b> {item.get('chapters_display')}</div>
+            <div class='meta-block'><b>Volumes:</b> {item.get('volumes_display')}</div>
+            <div class='meta-block'><b>Country:</b> {item['country'].upper()}</div>
+            <div class='meta-block'><b>Score:</b> {item['averageScore'] / 10:.1f}/10</div>
+            <div class='meta-block'><b>Dates:</b> {start_date} → {end_date}</div>
+            <div class='meta-block'><b>Popularity:</b> {item['popularity']} | <b>Favourites:</b> {item['favourites']}</div>
+            <div class='meta-block'><b>Source / Status:</b> {item['source'].title()} / {item['status'].title()}</div>
+            <div class='meta-block'><b>Similarity:</b> {item['similarity_score']}</div>
+        """
+
+    if True:  # was `with col:`
+        # Display the card
+        emit(f"""
+        <div class='card {card_class}'>
+            <img class='cover' src="{item['coverImage']}" alt="cover">
+            <h3 style='margin:10px 0;'>
+               <a href='https://anilist.co/{item["fetched_type"].lower()}/{item.get("id", "")}' target='_blank' style='color:#ffffff; text-decoration:none;'>
+                    {item['display_title'].title().rstrip('.')}
+                </a>
+            </h3>
+            {genres_html}
+            <div style='margin-top:8px;'>{meta_html}</div>
+            {relations_link}
+        </div>
+        """, unsafe_allow_html=True)
+
+        payloads.append("<st.expander>")
+        if True:  # was `with st.expander("Description"):`
+            alt_titles = []
+            if item.get('title_romaji') and item['title_romaji'] != item['display_title']:
+                alt_titles.append(f"Romaji: {format_title(item['title_romaji'].rstrip('.'))}")
+            if item.get('title_english') and item['title_english'] != item['display_title']:
+                alt_titles.append(f"English: {format_title(item['title_english'].rstrip('.'))}")
+            if item.get('title_native') and item['title_native'] != item['display_title']:
+                alt_titles.append(f"Native: {format_title(item['title_native'].rstrip('.'))}")
+            if alt_titles:
+                emit(f"**Alternative Titles:** {', '.join(alt_titles)}")
+            if item.get('tags'):
+                tags_list = [tag.strip() for tag in item['tags'].split(' ') if tag.strip()]
+                if tags_list:
+                    limited_tags = tags_list[:10]  # Show more tags
+                    tags_html = " ".join([
+                        f"<span style='background: linear-gradient(135deg, #667eea, #764ba2); color: white; padding: 6px 14px; border-radius: 20px; font-size: 0.75rem; margin: 2px 6px 4px 0; display: inline-block; border: 1px solid rgba(255,255,255,0.3); box-shadow: 0 3px 10px rgba(102, 126, 234, 0.4); transition: all 0.3s ease; font-weight: 600; cursor: pointer;' onmouseover=\"this.style.transform='translateY(-3px) scale(1.05)'; this.style.boxShadow='0 6px 15px rgba(102, 126, 234, 0.6)'\" onmouseout=\"this.style.transform='translateY(0) scale(1)'; this.style.boxShadow='0 3px 10px rgba(102, 126, 234, 0.4)'\">{tag.title()}</span>"
+                        for tag in limited_tags])
+                    emit(f"""
+                    <div style='margin: 4px 0; padding: 16px; background: rgba(30, 30, 46, 0.8); border-radius: 15px; border-left: 4px solid #667eea;'>
+                        <div style='font-weight: 700; color: #00d4ff; margin-bottom: 8px; font-size: 1rem;'>Popular Tags:</div>
+                        <div style='line-height: 1.8;'>{tags_html}</div>
+                    </div>
+                    """, unsafe_allow_html=True)
+            banner_bg = f"""
+                <div style='
+                    position: relative;
+                    border-radius: 10px;
+                    overflow: hidden;
+                    margin-bottom: 10px;
+                    max-height: 400px;
+                '>
+                    {f'<img src="{item["bannerImage"]}" style="width:100%; height:200px; object-fit:cover; opacity:0.3; filter:blur(1px);" alt="banner">' if item.get("bannerImage") else ''}
+                    <div style='
+                        position: absolute;
+                        top: 0;
+                        left: 0;
+                        right: 0;
+                        bottom: 0;
+                        padding: 20px;
+                        background: rgba(0, 0, 0, 0.7);
+                        overflow-y: auto;
+                    '>
+                        <div class='desc'>{format_description(item.get('description', ''))}</div>
+                    </div>
+                </div>
+                """
+            emit(banner_bg, unsafe_allow_html=True)
+
+        trailer_url = ""
+        trailer_id = item.get('trailer_id')
+        if trailer_id:
+            trailer_url = f"https://www.youtube.com/watch?v={trailer_id}"
+        else:
+            search_query = f"{item['display_title']} official trailer"
+            trailer_url = f"https://www.youtube.com/results?search_query={quote(search_query)}"
+        if item["trailer_thumbnail"]:
+            emit(
+                f"""
+                <div style='text-align: center; margin: 20px 0;'>
+                    <a href='{trailer_url}' target='_blank' style='text-decoration: none; display: block;'>
+                        <div style='position: relative; border-radius: 12px; overflow: hidden; box-shadow: 0 8px 25px rgba(0,0,0,0.4); transition: all 0.3s ease;' 
+                             onmouseover="this.style.transform='scale(1.03)'; this.style.boxShadow='0 12px 35px rgba(255,107,122,0.3)'" 
+                             onmouseout="this.style.transform='scale(1)'; this.style.boxShadow='0 8px 25px rgba(0,0,0,0.4)'">
+                            <img src='{item["trailer_thumbnail"]}' 
+                                 style='width:100%; height:auto; border-radius:12px; display:block;'
+                                 alt='Trailer Thumbnail'>
+                            <div style='position: absolute; top: 50%; left: 50%; transform: translate(-50%, -50%); background: rgba(255,107,122,0.9); border-radius: 50%; width: 60px; height: 60px; display: flex; align-items: center; justify-content: center;'>
+                                <svg xmlns="http://www.w3.org/2000/svg" width="30" height="30" fill="white" viewBox="0 0 24 24">
+                                    <path d="M8 5v14l11-7z"/>
+                                </svg>
+                            </div>
+                        </div>
+                    </a>
+                </div>
+                """,
+                unsafe_allow_html=True
+            )
+        else:
+            emit(f"""
+                <a href='{trailer_url}' target='_blank'>
+                    <div style='
+                        width:100%; 
+                        height:180px; 
+                        border-radius:12px; 
+                        background: linear-gradient(135deg, #ff4c60, #1b1b2f);
+                        display:flex; 
+                        align-items:center; 
+                        justify-content:center; 
+                        flex-direction:column;
+                        color:#ffffff; 
+                        font-weight:bold; 
+                        font-size:1rem;
+                        transition: transform 0.3s;
+                        box-shadow: 0 4px 14px rgba(0,0,0,0.3);
+                        margin-top: 20px;
+                    ' onmouseover="this.style.transform='scale(1.05)'" onmouseout="this.style.transform='scale(1.0)'">
+                        <svg xmlns="http://www.w3.org/2000/svg" width="46" height="46" fill="white" viewBox="0 0 24 24">
+                            <path d="M3 22V2l18 10-18 10z"/>
+                        </svg>
+                        <span style='margin-top:8px;'>Trailer Thumbnail Not Available</span>
+                    </div>
+                </a>
+            """, unsafe_allow_html=True)
+    return payloads
+
+
+# -----------------------------
+# Measurements
+# -----------------------------
+def make_items(n_cards, seed=0):
+    import cb_model
+
+    df = make_catalogue(max(n_cards * 20, 500), seed=seed)
+    sim = make_dense_similarity(make_factors(len(df), seed=seed))
+    order = sim[0].argsort()[::-1][1:n_cards + 1]
+    items = []
+    for i in order:
+        m = cb_model.format_recommendation(df, i, sim[0, i])
+        m["trailer_id"] = f"yt{i}" if i % 2 else None
+        items.append(m)
+    return items
+
+
+def measure_legacy(items, cols_per_row, repeat):
+    elements = payload = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        elements = payload = 0
+        for i in range(0, len(items), cols_per_row):
+            row = items[i:i + cols_per_row]
+            elements += 1 + cols_per_row  # st.columns container + one block per column
+            for item in row:
+                parts = legacy_card_payloads(item)
+                elements += len(parts)
+                payload += sum(len(p.encode("utf-8")) for p in parts)
+    elapsed = (time.perf_counter() - start) / repeat
+    return {"elements": elements, "payload_bytes": payload, "render_ms": round(elapsed * 1000, 3)}
+
+
+def measure_batched(items, cols_per_row, repeat, warm):
+    elements = payload = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        if not warm:
+            card_render.clear_card_cache()
+        elements = payload = 0
+        for i in range(0, len(items), cols_per_row):
+            row = items[i:i + cols_per_row]
+            html = card_render.render_row(row, [m["trailer_id"] for m in row], cols_per_row)
+            elements += 1
+            payload += len(html.encode("utf-8"))
+    elapsed = (time.perf_counter() - start) / repeat
+    return {"elements": elements, "payload_bytes": payload, "render_ms": round(elapsed * 1000, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=30)
+    parser.add_argument("--cols-per-row", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    items = make_items(args.cards)
+    card_render.render_row(items[:1])  # warm up template / import paths
+    result = {
+        "cards": len(items),
+        "legacy": measure_legacy(items, args.cols_per_row, args.repeat),
+        "batched_cold": measure_batched(items, args.cols_per_row, args.repeat, warm=False),
+        "batched_memoized": measure_batched(items, args.cols_per_row, args.repeat, warm=True),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Cost of building and consuming a page of results, before and after typed results.
+
+    python benchmarks/bench_results.py --results 30
+
+"legacy" reproduces the pre-cb_results path: one ``anime_df.loc[i].to_dict()``
+per result (every catalogue column plus the display fields), a DataFrame of
+those dicts, read back row by row with ``iloc``. "typed" is
+``cb_model.build_recommendations`` read through attributes, and "adapter"
+adds ``cb_results.to_dataframe`` for callers that still want a frame.
+Allocations are counted with tracemalloc; "retained" is what is still alive
+while the results are held. tracemalloc does not see buffers pandas keeps in
+Arrow (``str`` columns), so the legacy frame's footprint is understated.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import cb_model
+from cb_model import (clean_text, format_chapters, format_date, format_episodes, format_relations,
+                      format_volumes, safe_list)
+from cb_results import to_dataframe
+from synthetic import make_catalogue, make_dense_similarity, make_factors
+
+# Fields a card reads
+CONSUMED = ["id", "fetched_type", "display_title", "genres", "tags", "averageScore", "popularity", "status",
+            "episodes_display", "chapters_display", "similarity_score", "coverImage", "description"]
+
+
+def legacy_recommendation(anime_df, i, sim):
+    """Result dict as format_recommendation built it before cb_results."""
+    m = anime_df.loc[i].to_dict()
+    m["display_title"] = clean_text(m.get("display_title", "N/A"))
+    m["title_romaji"] = clean_text(m.get("title_romaji", "N/A"))
+    m["title_english"] = clean_text(m.get("title_english", "N/A"))
+    m["title_native"] = clean_text(m.get("title_native", "N/A"))
+    m["description"] = clean_text(m.get("description", "N/A"))
+    m["source"] = clean_text(m.get("source", "N/A"))
+    m["status"] = clean_text(m.get("status", "N/A"))
+    m["season"] = clean_text(m.get("season", "N/A"))
+    m["relations"] = format_relations(clean_text(m.get("relations", "")))
+    m["chapters_display"] = format_chapters(m.get("chapters"), m.get("status", "").lower())
+    m["volumes_display"] = format_volumes(m.get("volumes"), m.get("status", "").lower())
+    m["format"] = clean_text(m.get("format", "N/A"))
+    m["studio_links"] = safe_list(m.get("studio_links"))
+    m["studios"] = safe_list(m.get("studio"))
+    m["similarity_score"] = round(float(sim), 3)
+    m["start_date"] = format_date(m.get("start_year"), m.get("start_month"), m.get("start_day"), fallback="N/A")
+    m["end_date"] = format_date(m.get("end_year"), m.get("end_month"), m.get("end_day"), fallback="Ongoing")
+    m["episodes_display"] = format_episodes(m.get("episodes"), m.get("status").lower())
+    m["popularity"] = m.get("popularity") or 0
+    m["favourites"] = m.get("favourites") or 0
+    m["trailer_thumbnail"] = m.get("trailer_thumbnail") or ""
+    m["coverImage"] = m.get("coverImage") or ""
+    m["bannerImage"] = m.get("bannerImage") or ""
+    m["trailer_id"] = None
+    return m
+
+
+# -----------------------------
+# Paths
+# -----------------------------
+def build_legacy(anime_df, final_scores):
+    return pd.DataFrame([legacy_recommendation(anime_df, i, sim) for i, sim in final_scores])
+
+
+def consume_legacy(recs):
+    return sum(len(str(recs.iloc[k][f])) for k in range(len(recs)) for f in CONSUMED)
+
+
+def build_typed(anime_df, final_scores):
+    return cb_model.build_recommendations(anime_df, final_scores)
+
+
+def consume_typed(items):
+    return sum(len(str(getattr(m, f))) for m in items for f in CONSUMED)
+
+
+def build_adapter(anime_df, final_scores):
+    return to_dataframe(cb_model.RecommendationList(build_typed(anime_df, final_scores)))
+
+
+def measure(build, consume, anime_df, final_scores, repeat):
+    tracemalloc.start()
+    start_current = tracemalloc.get_traced_memory()[0]
+    result = build(anime_df, final_scores)
+    retained, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    del result
+
+    build_s = consume_s = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = build(anime_df, final_scores)
+        build_s += time.perf_counter() - start
+        start = time.perf_counter()
+        consume(result)
+        consume_s += time.perf_counter() - start
+    return {
+        "build_ms": round(build_s / repeat * 1000, 3),
+        "consume_ms": round(consume_s / repeat * 1000, 3),
+        "peak_kb": round((peak - start_current) / 1024, 1),
+        "retained_kb": round((retained - start_current) / 1024, 1),
+        "live_blocks": blocks,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--results", type=int, default=30)
+    parser.add_argument("--catalogue", type=int, default=8000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    anime_df = make_catalogue(args.catalogue, seed=0)
+    sim = make_dense_similarity(make_factors(len(anime_df), seed=0))
+    order = sim[0].argsort()[::-1][1:args.results + 1]
+    final_scores = [(anime_df.index[i], sim[0, i]) for i in order]
+
+    # Same values either way
+    legacy = build_legacy(anime_df, final_scores)
+    typed = build_typed(anime_df, final_scores)
+    assert all(legacy.iloc[k][f] == getattr(m, f) or pd.isna(legacy.iloc[k][f])
+               for k, m in enumerate(typed) for f in CONSUMED)
+
+    result = {
+        "results": len(final_scores),
+        "legacy": measure(build_legacy, consume_legacy, anime_df, final_scores, args.repeat),
+        "typed": measure(build_typed, consume_typed, anime_df, final_scores, args.repeat),
+        "adapter": measure(build_adapter, consume_legacy, anime_df, final_scores, args.repeat),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
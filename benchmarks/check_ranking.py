@@ -0,0 +1,303 @@
+"""
+Check the vectorised ranking against plain reference loops on a synthetic catalogue.
+
+    python benchmarks/check_ranking.py --size 1500 --queries 25
+
+The reference functions restate the original ``get_cb_recommendations``:
+pandas filtering, a fully sorted similarity list, and the genre/tag rerank
+with Python sets. There is also a naive MMR loop. The script compares them with
+
+- ``FilterIndex.mask`` for every filter combination
+- ``get_cb_recommendations`` (ids, scores and error codes)
+- cursor paging through ``next_cb_recommendations``
+- ``cb_batch.rank_block`` for whole blocks of seeds
+- ``mmr_select`` on random blocks with ties, and ``diversity=0``
+- ``RelationGraph`` franchises against a BFS over random relation edges,
+  and ``hide_related`` against the reference ranking without them
+
+It prints every failed check and exits with status 1 when one fails.
+Trailer lookups are stubbed, the run never touches the network.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+from rapidfuzz import process
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import cb_batch
+import cb_model
+import cb_relations
+from cb_results import RecommendationError
+from synthetic import make_catalogue, make_dense_similarity, make_factors, make_queries
+
+FILTER_COMBOS = [
+    (None, None),
+    ("ANIME", None),
+    ("ANIME", "TV"),
+    ("MANGA", None),
+    ("MANGA", "ALL"),
+    ("MANGA", "NOVEL"),
+    ("MANGA", "ONE_SHOT"),
+    ("manga", "manga"),
+]
+TOP_NS = (5, 15)
+
+
+# -----------------------------
+# Reference implementation (the original loops)
+# -----------------------------
+def reference_filter(anime_df, media_type=None, manga_format=None):
+    """Catalogue index left by the original pandas filters."""
+    df = anime_df
+    if media_type:
+        df = df[df["fetched_type"].str.upper() == media_type.upper()]
+    if media_type == "MANGA" and manga_format and manga_format.upper() != "ALL":
+        df = df[df["format"].str.upper() == manga_format.upper()]
+    return df.index
+
+
+def reference_resolve(anime_df, index, query):
+    """Row of the best alias match inside ``index``, or None below the score cut-off."""
+    alias_map = {}
+    for idx in index:
+        row = anime_df.loc[idx]
+        titles = cb_model.safe_list([row.get(c, "") for c in cb_model.TITLE_COLUMNS])
+        for title in titles:
+            alias_map[title.strip().lower()] = idx
+    raw_query = query.strip().lower()
+    match, score, _ = process.extractOne(cb_model.manual_aliases.get(raw_query, raw_query), list(alias_map))
+    return alias_map[match] if score >= 60 else None
+
+
+def reference_rank(anime_df, similarity_matrix, true_idx, index, top_n, drop_first=True):
+    """``[(row, sim), ...]`` as ranked and reranked by the original function."""
+    sim_scores = sorted(enumerate(similarity_matrix[true_idx]), key=lambda x: x[1], reverse=True)
+    allowed = set(index)
+    sim_scores = [x for x in sim_scores if x[0] in allowed]
+    sim_scores = sim_scores[1: top_n + 20] if drop_first else [x for x in sim_scores if x[0] != true_idx][:top_n + 19]
+
+    query_genres = set(cb_model.safe_list(anime_df.loc[true_idx]["genres"]))
+    query_tags = set(cb_model.safe_list(anime_df.loc[true_idx]["tags"]))
+
+    def genre_match_score(idx):
+        return len(query_genres & set(cb_model.safe_list(anime_df.loc[idx]["genres"])))
+
+    def combined_score(idx, sim):
+        t_score = len(query_tags & set(cb_model.safe_list(anime_df.loc[idx]["tags"])))
+        return genre_match_score(idx) * 0.4 + t_score * 0.2 + sim * 0.4
+
+    genre_top = [x for x in sim_scores if genre_match_score(x[0]) > 0][:4]
+    remaining = sorted([x for x in sim_scores if x not in genre_top], key=lambda x: combined_score(*x), reverse=True)
+    return genre_top + remaining[:top_n - len(genre_top)]
+
+
+def reference_mmr(relevance, pair_sims, k, diversity):
+    """Naive MMR: rescore every remaining candidate after each pick, ties to the earlier one."""
+    picked, rest = [], list(range(len(relevance)))
+    while rest and len(picked) < k:
+        def marginal(j):
+            redundancy = max((pair_sims[j][s] for s in picked), default=None)
+            gain = (1 - diversity) * relevance[j]
+            return gain if redundancy is None else gain - diversity * redundancy
+        best = max(rest, key=marginal)
+        picked.append(best)
+        rest.remove(best)
+    return picked
+
+
+def reference_franchise(media, anilist_id):
+    """AniList ids reachable from ``anilist_id`` over franchise relations (either direction), by BFS."""
+    neighbours = {}
+    for m in media:
+        for e in m["relations"]["edges"]:
+            if e["relationType"] in cb_relations.FRANCHISE_RELATIONS:
+                neighbours.setdefault(m["id"], set()).add(e["node"]["id"])
+                neighbours.setdefault(e["node"]["id"], set()).add(m["id"])
+    seen, queue = {anilist_id}, [anilist_id]
+    while queue:
+        for other in neighbours.get(queue.pop(), ()):
+            if other not in seen:
+                seen.add(other)
+                queue.append(other)
+    return seen
+
+
+def random_media(anime_df, seed=0, edges_per_title=0.4, outside_ids=50):
+    """``fetch_media``-style relation edges between random titles, some to ids outside the catalogue."""
+    rng = np.random.default_rng(seed)
+    ids = anime_df["id"].astype("int64").tolist()
+    outside = int(max(ids)) + 1
+    media = []
+    for anilist_id in ids:
+        edges = []
+        for _ in range(rng.poisson(edges_per_title)):
+            target = int(rng.choice(ids)) if rng.random() < 0.8 else outside + int(rng.integers(outside_ids))
+            edges.append({"relationType": cb_relations.RELATION_TYPES[rng.integers(len(cb_relations.RELATION_TYPES))],
+                          "node": {"id": target, "type": cb_relations.MEDIA_TYPES[rng.integers(2)]}})
+        media.append({"id": anilist_id, "relations": {"edges": edges}})
+    return media
+
+
+# -----------------------------
+# Checks
+# -----------------------------
+class Checks:
+    def __init__(self):
+        self.run = 0
+        self.failed = 0
+
+    def expect(self, ok, label):
+        self.run += 1
+        if not ok:
+            self.failed += 1
+            print(f"FAIL {label}")
+
+
+def _as_scores(result, anime_df):
+    ids = anime_df["id"].to_numpy()
+    return [(int(ids[i]), round(float(sim), 3)) for i, sim in result]
+
+
+def _listed(items):
+    return [(int(m.id), m.similarity_score) for m in items]
+
+
+def check_filters(checks, model, anime_df):
+    for media_type, manga_format in FILTER_COMBOS:
+        expected = np.zeros(len(anime_df), dtype=bool)
+        expected[reference_filter(anime_df, media_type, manga_format)] = True
+        checks.expect(np.array_equal(model.filters.mask(media_type, manga_format), expected),
+                      f"filter mask {media_type}/{manga_format}")
+
+
+def check_recommendations(checks, anime_df, similarity_matrix, queries):
+    for query in queries:
+        for media_type, manga_format in FILTER_COMBOS:
+            index = reference_filter(anime_df, media_type, manga_format)
+            true_idx = reference_resolve(anime_df, index, query) if len(index) else None
+            for top_n in TOP_NS:
+                label = f"recommendations {query!r} {media_type}/{manga_format} top_n={top_n}"
+                result = cb_model.get_cb_recommendations(query, top_n=top_n, media_type=media_type,
+                                                         manga_format=manga_format, as_frame=False)
+                if not len(index):
+                    checks.expect(isinstance(result, RecommendationError) and result.code == "empty_filter", label)
+                elif true_idx is None:
+                    checks.expect(isinstance(result, RecommendationError) and result.code == "no_match", label)
+                else:
+                    expected = reference_rank(anime_df, similarity_matrix, true_idx, index, top_n)
+                    checks.expect(not isinstance(result, RecommendationError)
+                                  and _listed(result) == _as_scores(expected, anime_df), label)
+
+
+def check_paging(checks, anime_df, similarity_matrix, queries, top_n=10):
+    for query in queries:
+        index = reference_filter(anime_df)
+        true_idx = reference_resolve(anime_df, index, query)
+        if true_idx is None:
+            continue
+        first = reference_rank(anime_df, similarity_matrix, true_idx, index, top_n)
+        shown = {i for i, _ in first}
+        rest = [x for x in reference_rank(anime_df, similarity_matrix, true_idx, index, cb_model.CURSOR_MAX_RESULTS)
+                if x[0] not in shown]
+        expected = _as_scores(first + rest[:cb_model.CURSOR_MAX_RESULTS - top_n], anime_df)
+
+        page = cb_model.get_cb_recommendations(query, top_n=top_n, paginate=True, as_frame=False)
+        seen = _listed(page)
+        while page.cursor:
+            page = cb_model.next_cb_recommendations(page.cursor, as_frame=False)
+            seen += _listed(page)
+        checks.expect(seen == expected, f"paging {query!r}")
+
+
+def check_batch(checks, model, anime_df, similarity_matrix, seed_rows, top_n=10):
+    for media_type, manga_format in FILTER_COMBOS[:4]:
+        index = reference_filter(anime_df, media_type, manga_format)
+        keep = model.filters.mask(media_type, manga_format)
+        rows, sims = cb_batch.rank_block(model, seed_rows, top_n, keep)
+        for seed, rec_rows, rec_sims in zip(seed_rows, rows, sims):
+            n = int((rec_rows >= 0).sum())
+            expected = reference_rank(anime_df, similarity_matrix, seed, index, top_n, drop_first=False)
+            checks.expect([(int(r), float(s)) for r, s in zip(rec_rows[:n], rec_sims[:n])] ==
+                          [(int(r), float(s)) for r, s in expected], f"batch seed {seed} {media_type}/{manga_format}")
+
+
+def check_mmr(checks, queries, trials=200, seed=0):
+    rng = np.random.default_rng(seed)
+    for trial in range(trials):
+        n = int(rng.integers(1, 60))
+        factors = rng.random((n, 5))
+        pair_sims = factors @ factors.T
+        relevance = np.sort(rng.random(n))[::-1]
+        if trial % 4 == 0:
+            # Coarse values, so ties in relevance and redundancy actually occur
+            relevance, pair_sims = np.round(relevance, 1), np.round(pair_sims, 1)
+        diversity = float(rng.choice([0.0, 0.3, 0.7, 1.0]))
+        k = int(rng.integers(0, n + 3))
+        checks.expect(cb_model.mmr_select(relevance, pair_sims, k, diversity).tolist() ==
+                      reference_mmr(relevance, pair_sims, k, diversity), f"mmr trial {trial}")
+
+    for query in queries:
+        plain = cb_model.get_cb_recommendations(query, top_n=15, as_frame=False)
+        neutral = cb_model.get_cb_recommendations(query, top_n=15, diversity=0, as_frame=False)
+        if not isinstance(plain, RecommendationError):
+            checks.expect(_listed(plain) == _listed(neutral), f"diversity=0 {query!r}")
+
+
+def check_franchises(checks, model, anime_df, similarity_matrix, queries, seed=0):
+    media = random_media(anime_df, seed)
+    graph = cb_relations.RelationGraph.from_media(media, anime_df)
+    ids = anime_df["id"].astype("int64").to_numpy()
+    catalogue = set(ids.tolist())
+    for row in range(len(anime_df)):
+        expected = (reference_franchise(media, int(ids[row])) & catalogue) - {int(ids[row])}
+        checks.expect(set(ids[graph.franchise_rows(row)].tolist()) == expected, f"franchise of row {row}")
+
+    model._relations = graph
+    index = reference_filter(anime_df)
+    for query in queries:
+        true_idx = reference_resolve(anime_df, index, query)
+        if true_idx is None:
+            continue
+        related = {int(r) for r in np.flatnonzero(np.isin(ids, list(reference_franchise(media, int(ids[true_idx])))))}
+        expected = reference_rank(anime_df, similarity_matrix, true_idx, index.difference(related - {true_idx}), 10)
+        result = cb_model.get_cb_recommendations(query, top_n=10, hide_related=True, as_frame=False)
+        checks.expect(_listed(result) == _as_scores(expected, anime_df), f"hide_related {query!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1500, help="synthetic catalogue size")
+    parser.add_argument("--queries", type=int, default=25)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    anime_df = make_catalogue(args.size, seed=args.seed)
+    # Edge cases: a missing alias and two titles sharing a display title
+    anime_df.loc[5, "title_english"] = np.nan
+    anime_df.loc[7, "display_title"] = anime_df.loc[8, "display_title"]
+    similarity_matrix = make_dense_similarity(make_factors(args.size, seed=args.seed))
+    queries = make_queries(anime_df, args.queries, seed=args.seed) + ["zzzz qqq", anime_df.loc[7, "display_title"]]
+
+    compacted, _ = cb_model.compact_catalogue(anime_df.copy())
+    model = cb_model.CBModel(compacted, similarity_matrix)
+    cb_model._model = model
+    cb_model.get_trailer_id = lambda anilist_id, media_type, save=True, deadline=None: None
+
+    checks = Checks()
+    check_filters(checks, model, anime_df)
+    check_recommendations(checks, anime_df, similarity_matrix, queries)
+    check_paging(checks, anime_df, similarity_matrix, queries)
+    check_batch(checks, model, anime_df, similarity_matrix, np.arange(0, args.size, max(1, args.size // 40)))
+    check_mmr(checks, queries)
+    check_franchises(checks, model, anime_df, similarity_matrix, queries, args.seed)
+    print(f"{checks.run - checks.failed} of {checks.run} checks passed")
+    return 1 if checks.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import numpy as np
+import pandas as pd
+
+
+# -----------------------------
+# Vocabularies
+# -----------------------------
+GENRES = [
+    "action", "adventure", "comedy", "drama", "ecchi", "fantasy", "horror",
+    "mahou shoujo", "mecha", "music", "mystery", "psychological", "romance",
+    "sci fi", "slice of life", "sports", "supernatural", "thriller",
+]
+
+TAGS = [
+    "shounen", "seinen", "shoujo", "josei", "isekai", "time loop", "revenge",
+    "school", "military", "super power", "magic", "demons", "swordplay",
+    "martial arts", "post apocalyptic", "dystopian", "survival", "tragedy",
+    "found family", "coming of age", "anti hero", "female protagonist",
+    "male protagonist", "ensemble cast", "episodic", "gore", "politics",
+    "space", "cyberpunk", "historical", "idol", "cooking", "detective",
+    "vampire", "ghost", "music band", "baseball", "basketball", "volleyball",
+    "love triangle", "slow burn", "heterosexual", "workplace", "iyashikei",
+]
+
+ANIME_FORMATS = ["tv", "tv_short", "movie", "ova", "ona", "special", "music"]
+MANGA_FORMATS = ["manga", "novel", "one_shot"]
+STATUSES = ["finished", "releasing", "not_yet_released", "cancelled", "hiatus"]
+SEASONS = ["winter", "spring", "summer", "fall", ""]
+COUNTRIES = ["jp", "kr", "cn", "tw"]
+SOURCES = ["original", "manga", "light_novel", "web_novel", "novel", "video_game", "visual_novel", "other"]
+RELATION_TYPES = ["ADAPTATION", "SEQUEL", "PREQUEL", "SIDE_STORY", "SPIN_OFF", "ALTERNATIVE", "CHARACTER", "SUMMARY", "OTHER"]
+
+SYLLABLES = [
+    "ka", "ki", "ku", "ke", "ko", "sa", "shi", "su", "se", "so", "ta", "chi",
+    "tsu", "te", "to", "na", "ni", "nu", "ne", "no", "ha", "hi", "fu", "he",
+    "ho", "ma", "mi", "mu", "me", "mo", "ya", "yu", "yo", "ra", "ri", "ru",
+    "re", "ro", "wa", "n", "ga", "gi", "go", "za", "ji", "zu", "da", "de",
+    "do", "ba", "bi", "bu", "be", "bo", "kyo", "ryu", "sho",
+]
+
+ENGLISH_WORDS = [
+    "blade", "titan", "heart", "shadow", "dream", "sky", "moon", "sun",
+    "hunter", "kingdom", "academy", "promise", "requiem", "chronicle", "spirit",
+    "flame", "frost", "garden", "world", "sword", "song", "journey", "tale",
+    "star", "night", "dawn", "demon", "angel", "saga", "legend", "code",
+]
+
+
+# -----------------------------
+# Generators
+# -----------------------------
+def _romaji_titles(rng, n):
+    lengths = rng.integers(2, 5, size=n)
+    sylls = rng.integers(0, len(SYLLABLES), size=(n, 4))
+    words = rng.integers(2, 4, size=n)
+    titles = []
+    for i in range(n):
+        word = "".join(SYLLABLES[s] for s in sylls[i, :lengths[i]])
+        titles.append(" ".join([word.capitalize()] + [SYLLABLES[s] for s in sylls[i, :words[i] - 1]]) + f" {i}")
+    return titles
+
+
+def _english_titles(rng, n):
+    picks = rng.integers(0, len(ENGLISH_WORDS), size=(n, 3))
+    has_english = rng.random(n) < 0.7
+    return [
+        ("The " + " ".join(ENGLISH_WORDS[p].capitalize() for p in picks[i]) + f" {i}") if has_english[i] else ""
+        for i in range(n)
+    ]
+
+
+def _join_choices(rng, vocab, n, low, high):
+    counts = rng.integers(low, high + 1, size=n)
+    return [" ".join(rng.choice(vocab, size=c, replace=False)) for c in counts]
+
+
+def _nullable(rng, values, null_frac):
+    values = values.astype(float)
+    values[rng.random(len(values)) < null_frac] = np.nan
+    return values
+
+
+def make_catalogue(n, seed=0, anime_frac=0.5):
+    """Build a random catalogue with the columns of the merged AniList frame."""
+    rng = np.random.default_rng(seed)
+    is_anime = rng.random(n) < anime_frac
+    fetched_type = np.where(is_anime, "ANIME", "MANGA")
+    fmt = np.where(
+        is_anime,
+        rng.choice(ANIME_FORMATS, size=n, p=[0.55, 0.05, 0.12, 0.1, 0.1, 0.06, 0.02]),
+        rng.choice(MANGA_FORMATS, size=n, p=[0.75, 0.2, 0.05]),
+    )
+    status = rng.choice(STATUSES, size=n, p=[0.7, 0.2, 0.04, 0.03, 0.03])
+
+    romaji = _romaji_titles(rng, n)
+    english = _english_titles(rng, n)
+    native = [f"タイトル{i}" for i in range(n)]
+    genres = _join_choices(rng, GENRES, n, 1, 4)
+    tags = _join_choices(rng, TAGS, n, 2, 8)
+    description = _join_choices(rng, ENGLISH_WORDS + TAGS, n, 20, 40)
+    studio = _join_choices(rng, ["mappa", "bones", "madhouse", "ufotable", "wit studio", "kyoto animation", "trigger", "a 1 pictures"], n, 1, 1)
+
+    targets = rng.integers(0, n, size=(n, 2))
+    rel_types = rng.integers(0, len(RELATION_TYPES), size=(n, 2))
+    rel_counts = rng.integers(0, 3, size=n)
+    relations = [
+        " ".join(f"{RELATION_TYPES[rel_types[i, k]]} {romaji[targets[i, k]]}" for k in range(rel_counts[i])).lower()
+        for i in range(n)
+    ]
+
+    start_year = rng.integers(1970, 2026, size=n)
+    end_year = _nullable(rng, start_year + rng.integers(0, 6, size=n), 0.2)
+    episodes = np.where(is_anime, rng.integers(1, 60, size=n), 0)
+    chapters = np.where(is_anime, 0, rng.integers(0, 400, size=n))
+    volumes = np.where(is_anime, 0, rng.integers(0, 40, size=n))
+
+    df = pd.DataFrame({
+        "id": np.arange(100000, 100000 + n),
+        "fetched_type": fetched_type,
+        "title_romaji": romaji,
+        "title_english": english,
+        "title_native": native,
+        "display_title": romaji,
+        "description": description,
+        "genres": genres,
+        "tags": tags,
+        "studio": studio,
+        "studio_links": ["https://anilist.co/studio/1"] * n,
+        "averageScore": rng.integers(30, 95, size=n),
+        "meanScore": rng.integers(30, 95, size=n),
+        "popularity": rng.zipf(1.6, size=n).clip(max=10**6),
+        "favourites": rng.integers(0, 50000, size=n),
+        "source": rng.choice(SOURCES, size=n),
+        "start_year": start_year,
+        "start_month": _nullable(rng, rng.integers(1, 13, size=n), 0.1),
+        "start_day": _nullable(rng, rng.integers(1, 29, size=n), 0.15),
+        "end_year": end_year,
+        "end_month": _nullable(rng, rng.integers(1, 13, size=n), 0.25),
+        "end_day": _nullable(rng, rng.integers(1, 29, size=n), 0.3),
+        "season": np.where(is_anime, rng.choice(SEASONS, size=n), ""),
+        "country": rng.choice(COUNTRIES, size=n, p=[0.8, 0.1, 0.07, 0.03]),
+        "episodes": episodes,
+        "duration": np.where(is_anime, rng.integers(3, 120, size=n), 0),
+        "chapters": chapters,
+        "volumes": volumes,
+        "relations": relations,
+        "format": fmt,
+        "status": status,
+        "coverImage": [f"https://img.example/cover/{i}.jpg" for i in range(n)],
+        "bannerImage": np.where(rng.random(n) < 0.5, "https://img.example/banner.jpg", ""),
+        "trailer_thumbnail": np.where(rng.random(n) < 0.4, "https://img.example/thumb.jpg", ""),
+    })
+    df["combined_text"] = df["description"] + " " + df["genres"] + " " + df["tags"] + " " + df["studio"]
+    return df
+
+
+def make_factors(n, dim=64, seed=0):
+    """Unit-norm random factors; sim = factors @ factors.T stays in [-1, 1]."""
+    rng = np.random.default_rng(seed + 1)
+    factors = rng.standard_normal((n, dim)).astype(np.float32)
+    factors /= np.linalg.norm(factors, axis=1, keepdims=True)
+    return factors
+
+
+def make_dense_similarity(factors):
+    """Dense fused-style matrix scaled to 0–1, like the shipped .npy."""
+    sim = factors.astype(np.float64) @ factors.T.astype(np.float64)
+    sim = (sim + 1.0) / 2.0
+    return sim
+
+
+class FactorSimilarity:
+    """Row-on-demand similarity for catalogues too large for a dense N×N file."""
+
+    def __init__(self, factors):
+        self.factors = factors
+        self.shape = (len(factors), len(factors))
+
+    def __getitem__(self, idx):
+        # Works for a single row (N,), a block of rows (k, N) and an np.ix_ block (k, m)
+        if isinstance(idx, tuple):
+            rows, cols = (np.ravel(i) for i in idx)
+            return (self.factors[rows] @ self.factors[cols].T + 1.0) / 2.0
+        return (self.factors[idx] @ self.factors.T + 1.0) / 2.0
+
+
+def make_queries(df, n_queries, seed=0):
+    """Mix of exact titles, English aliases and lightly misspelled titles."""
+    rng = np.random.default_rng(seed + 2)
+    picks = rng.integers(0, len(df), size=n_queries)
+    queries = []
+    for k, i in enumerate(picks):
+        row = df.iloc[i]
+        if k % 3 == 0 or not row["title_english"]:
+            q = row["display_title"]
+        elif k % 3 == 1:
+            q = row["title_english"]
+        else:
+            q = row["display_title"]
+            pos = int(rng.integers(1, max(2, len(q) - 1)))
+            q = q[:pos] + q[pos + 1:]
+        queries.append(q)
+    return queries
+
+
+def make_text_queries(n_queries, seed=0):
+    """Short "describe what you want" queries built from the genre/tag vocabularies."""
+    rng = np.random.default_rng(seed + 3)
+    return [
+        " ".join([*rng.choice(GENRES, size=2, replace=False), *rng.choice(TAGS, size=2, replace=False)])
+        for _ in range(n_queries)
+    ]
@@ -0,0 +1,246 @@
+"""
+HTML rendering for recommendation cards.
+
+Templates are compiled once at import. The per-title part of a card (cover,
+metadata, description, tags) is memoized by title id, so a rerun or a
+trailer update only substitutes the similarity score and the trailer block.
+A whole row of cards is emitted as one HTML payload, i.e. one
+``st.markdown`` call per row instead of several elements per card.
+"""
+import html
+import re
+import threading
+from collections import OrderedDict
+from string import Template
+from urllib.parse import quote
+
+CARD_CACHE_SIZE = 2048
+
+
+# -----------------------------
+# Text helpers
+# -----------------------------
+def format_description(desc: str) -> str:
+    if not desc or not isinstance(desc, str):
+        return "No description available."
+    desc = " ".join(desc.strip().split())
+    if not desc:
+        return "No description available."
+    desc = desc[0].upper() + desc[1:]
+    if desc and desc[-1] not in ".!?":
+         desc += "."
+    sentences = []
+    current = ""
+    words = desc.split()
+    for i, word in enumerate(words):
+        current += word + " "
+        next_word = words[i + 1] if i < len(words) - 1 else ""
+        if (word.endswith(('.', '!', '?')) or
+             (next_word and next_word[0].isupper() and len(current.split()) > 8)):
+             sentence = current.strip()
+             if sentence and not sentence[-1] in '.!?':
+                 sentence += '.'
+             sentences.append(sentence)
+             current = ""
+
+    if current.strip():
+        last_sentence = current.strip()
+        if not last_sentence[-1] in '.!?':
+            last_sentence += '.'
+        sentences.append(last_sentence)
+
+    formatted_desc = " ".join(sentences)
+    formatted_desc = re.sub(r'\s+([.,!?])', r'\1', formatted_desc)  # Remove space before punctuation
+    formatted_desc = re.sub(r'([.,!?])([A-Za-z])', r'\1 \2', formatted_desc)  # Add space after punctuation
+    formatted_desc = re.sub(r'\s+', ' ', formatted_desc)  # Remove extra spaces
+    return formatted_desc
+
+
+def format_title(title: str) -> str:
+    """Convert title to proper case while preserving acronyms and special words."""
+    if not title or not isinstance(title, str):
+        return "N/A"
+    # Remove trailing period and strip whitespace
+    title = title.strip().rstrip('.')
+    # Common anime/manga words that should stay capitalized
+    special_words = {'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X'}
+    words = title.split()
+    formatted_words = []
+    for i, word in enumerate(words):
+        if word.upper() in special_words or (len(word) > 1 and word.isupper()):
+            # Preserve acronyms and Roman numerals
+            formatted_words.append(word)
+        else:
+            # Capitalize first letter, lowercase the rest
+            formatted_words.append(word[0].upper() + word[1:].lower())
+    return ' '.join(formatted_words)
+
+
+def _esc(value):
+    """HTML-escape a value and protect ``$`` for the second template pass."""
+    return html.escape(str(value), quote=True).replace("$", "$$")
+
+
+# -----------------------------
+# Templates
+# -----------------------------
+CARD_TEMPLATE = Template("""<div class='card-cell'>
+<div class='card $card_class'>
+<img class='cover' src="$cover" alt="cover">
+<h3><a href='$url' target='_blank'>$title</a></h3>
+$genres
+<div class='card-meta'>$meta</div>
+<div class="relation-text"><a href="$url/relations" target="_blank" class="relation-toggle">View All Details →</a></div>
+</div>
+<details class='card-details'><summary>Description</summary>$alt_titles$tags
+<div class='banner-wrap'>$banner<div class='banner-overlay'><div class='desc'>$description</div></div></div>
+</details>
+$${trailer}
+</div>""")
+
+META_ROW = Template("<div class='meta-block'><b>$label:</b> $value</div>")
+
+ANIME_META = [
+    ("Type / Format", "type_format"), ("Episodes", "episodes_display"), ("Duration", "duration"),
+    ("Studio", "studio_html"), ("Season", "season"), ("Country", "country"), ("Score", "score"),
+    ("Dates", "dates"), ("Popularity", "popularity_html"), ("Source / Status", "source_status"),
+]
+MANGA_META = [
+    ("Type / Format", "type_format"), ("Chapters", "chapters_display"), ("Volumes", "volumes_display"),
+    ("Country", "country"), ("Score", "score"), ("Dates", "dates"),
+    ("Popularity", "popularity_html"), ("Source / Status", "source_status"),
+]
+
+TAGS_TEMPLATE = Template("<div class='tags-panel'><div class='tags-title'>Popular Tags:</div><div class='tags-list'>$tags</div></div>")
+
+TRAILER_THUMB_TEMPLATE = Template("""<div class='trailer-wrap'><a href='$url' target='_blank' class='trailer-thumb'>
+<img src='$thumbnail' alt='Trailer Thumbnail'>
+<div class='trailer-play'><svg xmlns="http://www.w3.org/2000/svg" width="30" height="30" fill="white" viewBox="0 0 24 24"><path d="M8 5v14l11-7z"/></svg></div>
+</a></div>""")
+
+TRAILER_FALLBACK_TEMPLATE = Template("""<a href='$url' target='_blank'><div class='trailer-fallback'>
+<svg xmlns="http://www.w3.org/2000/svg" width="46" height="46" fill="white" viewBox="0 0 24 24"><path d="M3 22V2l18 10-18 10z"/></svg>
+<span>Trailer Thumbnail Not Available</span>
+</div></a>""")
+
+ROW_TEMPLATE = Template("<div class='card-row' style='grid-template-columns:repeat($columns, minmax(0, 1fr));'>$cards</div>")
+
+
+# -----------------------------
+# Card rendering
+# -----------------------------
+# (id, media type) -> per-title Template, LRU; shared by every Streamlit session thread
+_card_cache = OrderedDict()
+_card_cache_lock = threading.Lock()
+
+
+def _meta_html(item, is_anime):
+    studios = item.get("studios", [])
+    studio_links = item.get("studio_links", [])
+    if studio_links:
+        studio_html = " | ".join(f"<a href='{_esc(link)}' target='_blank' class='studio-link'>{_esc(studio)}</a>"
+                                 for studio, link in zip(studios, studio_links))
+    else:
+        studio_html = "N/A"
+    start_date = item["start_date"] or "Unknown"
+    end_date = item["end_date"] or ("Still airing" if is_anime else "Still publishing")
+    values = {
+        "type_format": f"{_esc(item['fetched_type'].title())} / {_esc(item['format'].title())}",
+        "episodes_display": _esc(item.get("episodes_display")),
+        "chapters_display": _esc(item.get("chapters_display")),
+        "volumes_display": _esc(item.get("volumes_display")),
+        "duration": f"{_esc(item['duration'])} min",
+        "studio_html": studio_html,
+        "season": _esc(item["season"].title()),
+        "country": _esc(item["country"].upper()),
+        "score": f"{item['averageScore'] / 10:.1f}/10",
+        "dates": f"{_esc(start_date)} → {_esc(end_date)}",
+        "popularity_html": f"{_esc(item['popularity'])} | <b>Favourites:</b> {_esc(item['favourites'])}",
+        "source_status": f"{_esc(item['source'].title())} / {_esc(item['status'].title())}",
+    }
+    rows = [META_ROW.substitute(label=label, value=values[key])
+            for label, key in (ANIME_META if is_anime else MANGA_META)]
+    rows.append(META_ROW.substitute(label="Similarity", value="${similarity}"))
+    return "".join(rows)
+
+
+def _details_parts(item):
+    alt_titles = []
+    for label, key in (("Romaji", "title_romaji"), ("English", "title_english"), ("Native", "title_native")):
+        if item.get(key) and item[key] != item["display_title"]:
+            alt_titles.append(f"{label}: {format_title(item[key].rstrip('.'))}")
+    alt_html = f"<p class='alt-titles'><b>Alternative Titles:</b> {_esc(', '.join(alt_titles))}</p>" if alt_titles else ""
+
+    tags_html = ""
+    tags_list = [tag.strip() for tag in (item.get("tags") or "").split(" ") if tag.strip()]
+    if tags_list:
+        pills = " ".join(f"<span class='tag-pill'>{_esc(tag.title())}</span>" for tag in tags_list[:10])
+        tags_html = TAGS_TEMPLATE.substitute(tags=pills)
+
+    banner = f'<img class="banner-img" src="{_esc(item["bannerImage"])}" alt="banner">' if item.get("bannerImage") else ""
+    return alt_html, tags_html, banner
+
+
+def _card_template(item):
+    """Per-title Template with only ``similarity`` and ``trailer`` left open, memoized by id."""
+    key = (item.get("id"), item.get("fetched_type"))
+    with _card_cache_lock:
+        cached = _card_cache.get(key)
+        if cached is not None:
+            _card_cache.move_to_end(key)
+            return cached
+
+    is_anime = item["fetched_type"].upper() == "ANIME"
+    genres = item["genres"].split(",") if item["genres"] else []
+    alt_html, tags_html, banner = _details_parts(item)
+    body = CARD_TEMPLATE.substitute(
+        card_class="card-anime" if is_anime else "card-manga",
+        cover=_esc(item["coverImage"]),
+        url=f"https://anilist.co/{_esc(item['fetched_type'].lower())}/{_esc(item.get('id', ''))}",
+        title=_esc(item["display_title"].title().rstrip(".")),
+        genres=" ".join(f"<span class='badge'>{_esc(g.title())}</span>" for g in genres),
+        meta=_meta_html(item, is_anime),
+        alt_titles=alt_html,
+        tags=tags_html,
+        banner=banner,
+        description=_esc(format_description(item.get("description", ""))),
+    )
+    template = Template(body)
+    with _card_cache_lock:
+        _card_cache[key] = template
+        _card_cache.move_to_end(key)
+        if len(_card_cache) > CARD_CACHE_SIZE:
+            _card_cache.popitem(last=False)
+    return template
+
+
+def clear_card_cache():
+    with _card_cache_lock:
+        _card_cache.clear()
+
+
+def render_trailer(item, trailer_id=None):
+    """Trailer thumbnail linking to the YouTube video, or a search when the id is unknown."""
+    if trailer_id:
+        trailer_url = f"https://www.youtube.com/watch?v={quote(str(trailer_id))}"
+    else:
+        search_query = f"{item['display_title']} official trailer"
+        trailer_url = f"https://www.youtube.com/results?search_query={quote(search_query)}"
+    if item["trailer_thumbnail"]:
+        return TRAILER_THUMB_TEMPLATE.substitute(url=html.escape(trailer_url), thumbnail=html.escape(item["trailer_thumbnail"]))
+    return TRAILER_FALLBACK_TEMPLATE.substitute(url=html.escape(trailer_url))
+
+
+def render_card(item, trailer_id=None):
+    """Full HTML for one card, including description panel and trailer."""
+    return _card_template(item).substitute(
+        similarity=html.escape(str(item["similarity_score"])),
+        trailer=render_trailer(item, trailer_id),
+    )
+
+
+def render_row(items, trailer_ids=None, columns=4):
+    """One HTML payload for a row of cards."""
+    trailer_ids = trailer_ids or [None] * len(items)
+    cards = "".join(render_card(item, trailer_id) for item, trailer_id in zip(items, trailer_ids))
+    return ROW_TEMPLATE.substitute(columns=columns, cards=cards)
@@ -0,0 +1,126 @@
+"""
+Versioned model artifacts.
+
+similarity.ipynb writes the artifacts and then a ``manifest.json`` above
+them:
+
+    {
+      "version": "20250131T120000Z",
+      "created": "2025-01-31T12:00:00+00:00",
+      "files": {
+        "anime_data": {"path": "versions/20250131T120000Z/anime_cb_data.pkl", "sha256": "..."},
+        "fused_sim": {"path": "versions/20250131T120000Z/fused_sim.npy", "sha256": "..."},
+        ...
+      }
+    }
+
+Paths are relative to the manifest. Every version is written to its own
+directory (``versions/<version>/``), so publishing one never touches the
+files of a model that is still serving. The manifest is written last, with
+an atomic rename, so a reader sees either the previous version or the
+complete new one. The runtime loads through it (``cb_model.CBModel.load``),
+checks the checksums, loads every listed artifact at once and watches it
+for new versions (``cb_model.start_artifact_watcher``).
+"""
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+# Where the runtime reads and watches the manifest, and where similarity.ipynb publishes it
+MANIFEST_PATH = os.environ.get("ANISENSE_MANIFEST", "data/manifest.json")
+
+ARTIFACT_KEYS = ("anime_data", "fused_sim", "tfidf_vectorizer", "fusion_components", "tfidf_matrix", "relation_graph")
+REQUIRED_KEYS = ("anime_data", "fused_sim", "tfidf_vectorizer")
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactManifest:
+    """Artifact paths of one version, plus their checksums."""
+
+    def __init__(self, version, paths, checksums=None, path=None):
+        self.version = version
+        self.paths = dict(paths)
+        self.checksums = dict(checksums or {})
+        self.path = path
+
+    @classmethod
+    def read(cls, path):
+        """
+        Parse ``path``; raises ValueError when a required artifact is not
+        listed. Flat ``{key: filename}`` manifests written by older notebooks
+        are accepted; their version is a hash of the manifest.
+        """
+        with open(path, "rb") as f:
+            raw = f.read()
+        data = json.loads(raw)
+        base = os.path.dirname(os.path.abspath(path))
+        paths, checksums = {}, {}
+        for key, entry in data.get("files", data).items():
+            if key not in ARTIFACT_KEYS:
+                continue
+            if isinstance(entry, str):
+                entry = {"path": entry}
+            paths[key] = os.path.join(base, entry["path"])
+            if entry.get("sha256"):
+                checksums[key] = entry["sha256"]
+        missing = [key for key in REQUIRED_KEYS if key not in paths]
+        if missing:
+            raise ValueError(f"{path} does not list {', '.join(missing)}.")
+        version = data.get("version") or hashlib.sha256(raw).hexdigest()[:12]
+        return cls(version, paths, checksums, path)
+
+    def verify(self):
+        """Raise ValueError when a listed file does not match its checksum."""
+        for key, expected in self.checksums.items():
+            if file_sha256(self.paths[key]) != expected:
+                raise ValueError(f"Checksum mismatch for {self.paths[key]} ({key}), version {self.version}.")
+
+
+def new_version():
+    """Version id for a build: the UTC time, e.g. ``20250131T120000Z``."""
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def version_dir(directory, version):
+    """Directory for the files of ``version`` (created); its paths go into the manifest relative to ``directory``."""
+    path = os.path.join(directory, "versions", version)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _umask():
+    # The umask can only be read by setting it
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def write_manifest(directory, files, version=None, name="manifest.json"):
+    """
+    Checksum ``files`` (``{key: path}`` relative to ``directory``) and
+    publish them as a new version by atomically replacing
+    ``directory/name``. Returns the manifest dict.
+    """
+    now = datetime.now(timezone.utc)
+    manifest = {
+        "version": version or new_version(),
+        "created": now.isoformat(timespec="seconds"),
+        "files": {key: {"path": name, "sha256": file_sha256(os.path.join(directory, name))}
+                  for key, name in files.items()},
+    }
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".json.tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(manifest, f, indent=2)
+    # mkstemp creates the file owner-only; the app may run as another user, so use the usual umask mode
+    os.chmod(tmp, 0o666 & ~_umask())
+    os.replace(tmp, os.path.join(directory, name))
+    return manifest
@@ -0,0 +1,308 @@
+"""
+Batch recommendations for offline precomputation ("similar titles" rails).
+
+    python cb_batch.py --output rails.jsonl --top-n 15 --workers 4
+    python cb_batch.py --queries "naruto,one piece" --output rails.parquet
+
+The model is loaded once and shared (forked) by the worker processes. Rows
+are processed in blocks: one (B × N) slice of the similarity matrix, a
+vectorized top-K and the genre/tag rerank over the whole block. Network
+enrichment (formatted fields + trailer ids) is optional and runs in the
+parent process only, so the trailer cache file has a single writer.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import time
+from dataclasses import fields
+
+import numpy as np
+
+import cb_model
+from cb_results import Recommendation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 256
+
+_worker_model = None
+
+
+# -----------------------------
+# Block ranking
+# -----------------------------
+def _top_candidates_block(scores, k):
+    """(B, k) best columns per row, ties by column order, -1 where fewer than k are finite."""
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.lexsort((top, -top_scores), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    return np.where(np.isfinite(top_scores), top, -1), np.where(np.isfinite(top_scores), top_scores, 0.0)
+
+
+def rank_block(model, seed_rows, top_n, keep=None, fusion_weights=None, recency_weight=None):
+    """Ranked ``(rows, sims)`` for a block of seed rows; each seed is excluded from its own list."""
+    seed_rows = np.asarray(seed_rows, dtype=np.int64)
+    scores = np.array(model.similarity_rows(seed_rows, fusion_weights, recency_weight), dtype=np.float64, ndmin=2)
+    if keep is not None:
+        scores[:, ~keep] = -np.inf
+    scores[np.arange(len(seed_rows)), seed_rows] = -np.inf
+    candidates, sims = _top_candidates_block(scores, top_n + 19)
+    return cb_model.rerank_block(model, seed_rows, candidates, sims, top_n)
+
+
+def _block_records(model, seed_rows, top_n, keep, fusion_weights=None, recency_weight=None):
+    ids = model.anime_df["id"].to_numpy()
+    rows, sims = rank_block(model, seed_rows, top_n, keep, fusion_weights, recency_weight)
+    records = []
+    for seed, rec_rows, rec_sims in zip(seed_rows, rows, sims):
+        n = int((rec_rows >= 0).sum())
+        records.append({
+            "seed_id": int(ids[seed]),
+            "seed_row": int(seed),
+            "recommendations": [
+                {"id": int(ids[r]), "row": int(r), "similarity_score": round(float(s), 3)}
+                for r, s in zip(rec_rows[:n], rec_sims[:n])
+            ],
+        })
+    return records
+
+
+def _init_worker():
+    global _worker_model
+    if _worker_model is None:
+        _worker_model = cb_model.CBModel.load()
+
+
+def _worker_block(args):
+    return _block_records(_worker_model, *args)
+
+
+# -----------------------------
+# Enrichment
+# -----------------------------
+def _enrich(model, records):
+    """Add display fields and trailer ids to every recommendation (network)."""
+    recs = [rec for record in records for rec in record["recommendations"]]
+    formatted = cb_model.build_recommendations(
+        model.anime_df, [(model.anime_df.index[rec["row"]], rec["similarity_score"]) for rec in recs])
+    # Rate-limited bulk lookup, one cache write; ids whose lookup failed stay None
+    cb_model.prefetch_trailer_ids([(m.id, m.fetched_type) for m in formatted], cb_model.TRAILER_WORKERS)
+    for rec, m in zip(recs, formatted):
+        m.trailer_id = cb_model.get_cached_trailer_id(m.id, m.fetched_type)
+        rec.update(m.to_dict())
+    return records
+
+
+# -----------------------------
+# Writers
+# -----------------------------
+class _JsonlWriter:
+    def __init__(self, path):
+        self.f = open(path, "w", encoding="utf-8")
+
+    def write(self, records):
+        for record in records:
+            self.f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def close(self):
+        self.f.close()
+
+
+def _parquet_value(v):
+    if isinstance(v, list):
+        return json.dumps(v)
+    # Missing catalogue values arrive as NaN, which Arrow rejects in a string column
+    return None if isinstance(v, float) and v != v else v
+
+
+def _parquet_type(pa, annotation):
+    # Lists are written as JSON strings, like any other non-numeric field
+    if annotation is int:
+        return pa.int64()
+    if annotation is float:
+        return pa.float64()
+    return pa.string()
+
+
+class _ParquetWriter:
+    """
+    Long format, one row per (seed, rank); one row group per block. Column
+    types come from the ``Recommendation`` fields rather than the first
+    block, where a field may be all None (e.g. no trailers yet).
+    """
+
+    TYPES = {"seed_id": int, "rank": int, **{f.name: f.type for f in fields(Recommendation)}}
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow).") from e
+        self.pa, self.pq, self.path, self.writer = pa, pq, path, None
+
+    def write(self, records):
+        rows = [
+            {"seed_id": r["seed_id"], "rank": rank, "id": rec["id"], "similarity_score": rec["similarity_score"],
+             **{k: _parquet_value(v) for k, v in rec.items() if k not in ("id", "row", "similarity_score")}}
+            for r in records for rank, rec in enumerate(r["recommendations"])
+        ]
+        if not rows:
+            return
+        if self.writer is None:
+            schema = self.pa.schema([(name, _parquet_type(self.pa, self.TYPES.get(name))) for name in rows[0]])
+            self.writer = self.pq.ParquetWriter(self.path, schema)
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _open_writer(output, output_format):
+    output_format = output_format or ("parquet" if str(output).endswith(".parquet") else "jsonl")
+    if output_format == "parquet":
+        return _ParquetWriter(output)
+    if output_format == "jsonl":
+        return _JsonlWriter(output)
+    raise ValueError(f"Unknown output format '{output_format}', expected 'jsonl' or 'parquet'.")
+
+
+# -----------------------------
+# Public API
+# -----------------------------
+def resolve_seeds(model, ids=None, queries=None):
+    """Catalogue rows for AniList ids and/or title queries, plus whatever could not be resolved."""
+    rows, unresolved = [], []
+    for anilist_id in ids or []:
+        row = model.row_by_id.get(int(anilist_id))
+        if row is None:
+            unresolved.append(anilist_id)
+        else:
+            rows.append(row)
+    if queries:
+        alias_map, choices = model.alias_lookup()
+        for query in queries:
+            row = cb_model.resolve_title(query, alias_map, choices)
+            if row is None:
+                unresolved.append(query)
+            else:
+                rows.append(row)
+    return rows, unresolved
+
+
+def iter_batch_recommendations(model=None, ids=None, queries=None, top_n=10, media_type=None, manga_format=None,
+                               enrich=False, workers=1, block_size=DEFAULT_BLOCK_SIZE, stats=None,
+                               fusion_weights=None, recency_weight=None):
+    """
+    Yield one record per seed: ``{"seed_id", "seed_row", "recommendations": [...]}``.
+
+    Seeds are the given AniList ``ids`` and title ``queries``; with neither,
+    every title in the catalogue. Blocks are spread over ``workers``
+    processes when ``workers > 1``; output order follows the input order.
+    ``fusion_weights`` / ``recency_weight`` re-fuse the similarities as in
+    ``cb_model.get_cb_recommendations``.
+    """
+    global _worker_model
+    model = model if model is not None else cb_model.CBModel.load()
+    if ids is None and queries is None:
+        seed_rows, unresolved = list(range(len(model))), []
+    else:
+        seed_rows, unresolved = resolve_seeds(model, ids, queries)
+    if stats is not None:
+        stats["unresolved"] = unresolved
+    keep = model.filters.mask(media_type, manga_format)
+    if fusion_weights is not None or recency_weight is not None:
+        # Load and validate once in the parent so forked workers share the factors
+        model.fusion.resolve_weights(fusion_weights, recency_weight)
+    tasks = [(seed_rows[i:i + block_size], top_n, keep, fusion_weights, recency_weight)
+             for i in range(0, len(seed_rows), block_size)]
+
+    if workers and workers > 1 and len(tasks) > 1:
+        # Forked workers inherit the loaded model instead of reloading the artifacts
+        _worker_model = model
+        ctx = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        pool = (ctx or multiprocessing).Pool(workers, initializer=_init_worker)
+        blocks = pool.imap(_worker_block, tasks)
+    else:
+        pool = None
+        blocks = (_block_records(model, *task) for task in tasks)
+
+    try:
+        for records in blocks:
+            yield from (_enrich(model, records) if enrich else records)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        _worker_model = None
+
+
+def run_batch(output, model=None, ids=None, queries=None, top_n=10, media_type=None, manga_format=None,
+              enrich=False, workers=1, block_size=DEFAULT_BLOCK_SIZE, output_format=None, fusion_weights=None,
+              recency_weight=None):
+    """Stream batch recommendations to a JSONL or Parquet file and report throughput."""
+    stats = {}
+    start = time.perf_counter()
+    writer = _open_writer(output, output_format)
+    titles, buffer = 0, []
+    try:
+        for record in iter_batch_recommendations(model, ids, queries, top_n, media_type, manga_format,
+                                                 enrich, workers, block_size, stats, fusion_weights, recency_weight):
+            buffer.append(record)
+            titles += 1
+            if len(buffer) >= block_size:
+                writer.write(buffer)
+                buffer = []
+        writer.write(buffer)
+    finally:
+        writer.close()
+    seconds = time.perf_counter() - start
+    stats.update({
+        "titles": titles,
+        "seconds": round(seconds, 3),
+        "titles_per_sec": round(titles / seconds, 1) if seconds > 0 else None,
+        "output": str(output),
+    })
+    logger.info("Batch recommendations: %s titles in %.1fs (%s titles/s)", titles, seconds, stats["titles_per_sec"])
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", required=True, help="output file (.jsonl or .parquet)")
+    parser.add_argument("--ids", default=None, help="comma separated AniList ids (default: whole catalogue)")
+    parser.add_argument("--queries", default=None, help="comma separated title queries")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--media-type", default=None)
+    parser.add_argument("--manga-format", default=None)
+    parser.add_argument("--enrich", action="store_true", help="add display fields and trailer ids (network)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+    parser.add_argument("--format", dest="output_format", choices=["jsonl", "parquet"], default=None)
+    parser.add_argument("--fusion-weights", default=None,
+                        help="override fusion weights, e.g. semantic=0.5,lexical=0.3 (needs fusion_components.npz)")
+    parser.add_argument("--recency-weight", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    fusion_weights = None
+    if args.fusion_weights:
+        fusion_weights = {k.strip(): float(v) for k, v in (pair.split("=") for pair in args.fusion_weights.split(","))}
+
+    logging.basicConfig(level=logging.INFO)
+    stats = run_batch(
+        args.output,
+        ids=[int(x) for x in args.ids.split(",")] if args.ids else None,
+        queries=[q.strip() for q in args.queries.split(",")] if args.queries else None,
+        top_n=args.top_n, media_type=args.media_type, manga_format=args.manga_format,
+        enrich=args.enrich, workers=args.workers, block_size=args.block_size, output_format=args.output_format,
+        fusion_weights=fusion_weights, recency_weight=args.recency_weight,
+    )
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Query-time re-fusion of the similarity components.
+
+The shipped ``.npy`` is ``apply_recency_weight(fuse_similarities(...))`` with
+the build-time weights baked in. Every component is a dot product of
+per-title vectors, so the build also writes those vectors to
+``fusion_components.npz``:
+
+- semantic: L2-normalised sentence embeddings
+- lexical: TF-IDF rows (sparse)
+- numeric: min-max scaled ``NUMERIC_FEATURES``
+- categorical: L2-normalised one-hot ``format`` / ``season`` / ``country``
+- recency: the per-title score behind ``apply_recency_weight``
+
+It also stores the normalisation constants. With these, any similarity row
+can be recomputed for other weights in one (k × N) pass without rebuilding
+the matrix. With the build weights the rows match the shipped matrix.
+
+``lexical_similarity`` computes the lexical term without densifying it: it
+multiplies the TF-IDF rows in blocks and prunes every row to its top-K (and/or
+a threshold), so its memory follows the kept non-zeros instead of N². It is
+meant for a top-K fused artifact. The shipped build keeps the exact dense
+term (``lexical_top_k=None``), because the other components and the fused
+matrix are N × N anyway, so pruning would change rankings without lowering
+peak memory. When components are built with a top-K, the same pruning is
+applied to re-fused rows.
+
+With other weights the global min-max normalisation of the fused matrix has
+to be estimated. The maximum is exact: every component is a Gram matrix, so
+the maximum lies on the diagonal. The minimum is bounded by the weighted
+component minima. Without recency that affine map changes no ranking.
+With recency it slightly shifts the fused/recency balance. ``calibrate()``
+computes the exact constants for a weight set in one blockwise pass (seconds
+for the shipped catalogue); use it for A/B variants that must match a rebuild.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+DEFAULT_FUSION_WEIGHTS = {"semantic": 0.6, "lexical": 0.2, "numeric": 0.15, "categorical": 0.05}
+DEFAULT_RECENCY_WEIGHT = 0.1
+COMPONENTS = tuple(DEFAULT_FUSION_WEIGHTS)
+
+NUMERIC_FEATURES = ["meanScore", "averageScore", "popularity", "favourites", "duration", "episodes", "chapters", "volumes"]
+CATEGORICAL_FEATURES = ["format", "season", "country"]
+
+
+# -----------------------------
+# Per-title factors (same maths as similarity.ipynb)
+# -----------------------------
+def numeric_factors(df):
+    from sklearn.preprocessing import MinMaxScaler
+
+    present = [c for c in NUMERIC_FEATURES if c in df.columns]
+    if not present:
+        return np.zeros((len(df), 1))
+    return MinMaxScaler().fit_transform(df[present].fillna(0).astype(float))
+
+
+def categorical_factors(df):
+    from sklearn.preprocessing import OneHotEncoder
+
+    enc = OneHotEncoder(handle_unknown="ignore", sparse_output=False)
+    mat = enc.fit_transform(df[CATEGORICAL_FEATURES].fillna("").astype(str))
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def recency_scores(df, current_year=None):
+    """Per-title recency in 0–1 as used by ``apply_recency_weight``, or None without ``start_year``."""
+    if "start_year" not in df.columns:
+        return None
+    current_year = current_year or pd.Timestamp.now().year
+    start_year = df["start_year"].fillna(df["start_year"].min()).astype(float)
+    end_year = df.get("end_year", pd.Series([current_year] * len(df))).fillna(current_year).astype(float)
+
+    recency = (start_year - start_year.min()) / (start_year.max() - start_year.min() + 1e-9)
+    recency += ((end_year - start_year) / (current_year - start_year.min() + 1e-9)) * 0.5
+    recency = (recency - recency.min()) / (recency.max() - recency.min() + 1e-9)
+    return recency.to_numpy(dtype=np.float64)
+
+
+def _normalise(values, lo, hi):
+    return (values - lo) / (hi - lo if hi > lo else 1.0)
+
+
+# -----------------------------
+# Sparse lexical similarity
+# -----------------------------
+def prune_rows(block, top_k=None, threshold=0.0):
+    """
+    Keep the entries of each row of a sparse block above ``threshold``, at
+    most ``top_k`` of them (largest first, ties to the lower column).
+    The top-K selection works on the block densified, i.e. in
+    (rows × N) memory.
+    """
+    block = sparse.csr_matrix(block)
+    if top_k is None or top_k >= block.shape[1]:
+        if threshold > 0:
+            block = block.multiply(block > threshold).tocsr()
+        return block
+
+    values = block.toarray()
+    kth = -np.partition(-values, top_k - 1, axis=1)[:, top_k - 1]
+    keep = values > np.maximum(kth, threshold)[:, None]
+    # Rows where the k-th value is tied: fill up with the lowest columns holding it
+    short = np.flatnonzero((keep.sum(axis=1) < top_k) & (kth > threshold))
+    for r in short:
+        ties = np.flatnonzero(values[r] == kth[r])
+        keep[r, ties[:top_k - keep[r].sum()]] = True
+    rows, cols = np.nonzero(keep)
+    return sparse.csr_matrix((values[rows, cols], (rows, cols)), shape=block.shape)
+
+
+def lexical_similarity(matrix, top_k=None, threshold=0.0, block_size=256):
+    """
+    (N, N) sparse cosine similarity of L2-normalised TF-IDF rows, computed
+    ``block_size`` rows at a time and pruned per row with ``prune_rows``.
+    Without ``top_k`` / ``threshold`` every non-zero is kept (exact).
+    """
+    matrix = sparse.csr_matrix(matrix)
+    transposed = matrix.T.tocsr()
+    blocks = [prune_rows(matrix[start:start + block_size] @ transposed, top_k, threshold)
+              for start in range(0, matrix.shape[0], block_size)]
+    return sparse.vstack(blocks, format="csr")
+
+
+# -----------------------------
+# Components
+# -----------------------------
+class FusionComponents:
+    """Per-title component factors plus the normalisation constants of the build."""
+
+    def __init__(self, semantic, lexical, numeric, categorical, recency=None, weights=None,
+                 recency_weight=DEFAULT_RECENCY_WEIGHT, ranges=None, lexical_top_k=None, lexical_threshold=0.0):
+        self.factors = {
+            "semantic": np.asarray(semantic, dtype=np.float32),
+            "lexical": sparse.csr_matrix(lexical),
+            "numeric": np.asarray(numeric, dtype=np.float64),
+            "categorical": np.asarray(categorical, dtype=np.float64),
+        }
+        self.recency = None if recency is None else np.asarray(recency, dtype=np.float64)
+        self.weights = dict(weights or DEFAULT_FUSION_WEIGHTS)
+        self.recency_weight = recency_weight
+        # Pruning of the lexical rows, as in the build (see lexical_similarity)
+        self.lexical_top_k = lexical_top_k
+        self.lexical_threshold = lexical_threshold
+        self._diagonal = {
+            "semantic": np.einsum("ij,ij->i", self.factors["semantic"], self.factors["semantic"], dtype=np.float64),
+            "lexical": np.asarray(self.factors["lexical"].multiply(self.factors["lexical"]).sum(axis=1)).ravel(),
+            "numeric": np.einsum("ij,ij->i", self.factors["numeric"], self.factors["numeric"]),
+            "categorical": np.einsum("ij,ij->i", self.factors["categorical"], self.factors["categorical"]),
+        }
+        self.ranges = ranges if ranges is not None else self._compute_ranges(self.weights, self.recency_weight)
+
+    def __len__(self):
+        return self.factors["semantic"].shape[0]
+
+    @classmethod
+    def build(cls, df, vectorizer, embeddings, weights=None, recency_weight=DEFAULT_RECENCY_WEIGHT, current_year=None,
+              lexical_top_k=None, lexical_threshold=0.0):
+        """
+        Factors for a catalogue; ``embeddings`` are the raw sentence
+        embeddings in row order, the lexical pruning is the one the fused
+        matrix was built with.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return cls(
+            semantic=embeddings,
+            lexical=vectorizer.transform(df["combined_text"].fillna("").tolist()),
+            numeric=numeric_factors(df),
+            categorical=categorical_factors(df),
+            recency=recency_scores(df, current_year),
+            weights=weights,
+            recency_weight=recency_weight,
+            lexical_top_k=lexical_top_k,
+            lexical_threshold=lexical_threshold,
+        )
+
+    def save(self, path):
+        lexical = self.factors["lexical"]
+        meta = {"weights": self.weights, "recency_weight": self.recency_weight, "ranges": self.ranges,
+                "lexical_top_k": self.lexical_top_k, "lexical_threshold": self.lexical_threshold}
+        np.savez(
+            path,
+            semantic=self.factors["semantic"],
+            lexical_data=lexical.data, lexical_indices=lexical.indices, lexical_indptr=lexical.indptr,
+            lexical_shape=np.asarray(lexical.shape),
+            numeric=self.factors["numeric"],
+            categorical=self.factors["categorical"],
+            recency=self.recency if self.recency is not None else np.empty(0),
+            meta=np.asarray(json.dumps(meta)),
+        )
+
+    @classmethod
+    def load(cls, path):
+        try:
+            data = np.load(path, allow_pickle=False)
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Query-time fusion needs {path}; rebuild the artifacts with similarity.ipynb.") from e
+        with data:
+            meta = json.loads(str(data["meta"]))
+            lexical = sparse.csr_matrix((data["lexical_data"], data["lexical_indices"], data["lexical_indptr"]),
+                                        shape=tuple(data["lexical_shape"]))
+            recency = data["recency"]
+            return cls(data["semantic"], lexical, data["numeric"], data["categorical"],
+                       recency=recency if recency.size else None, weights=meta["weights"],
+                       recency_weight=meta["recency_weight"], ranges=meta["ranges"],
+                       lexical_top_k=meta.get("lexical_top_k"), lexical_threshold=meta.get("lexical_threshold", 0.0))
+
+    # -----------------------------
+    # Scoring
+    # -----------------------------
+    def component_rows(self, rows, cols=None):
+        """
+        ``{component: (k, N) similarities}`` for the given rows, or
+        (k, len(cols)) restricted to ``cols``. Only the requested columns are
+        computed, except for the lexical term of components built with a
+        top-K: that pruning needs the full (k, N) rows.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        f = self.factors
+        other = (lambda a: a) if cols is None else (lambda a: a[cols])
+        if self.lexical_top_k is None:
+            # A threshold is per entry, so it prunes the restricted block the same way
+            lexical = prune_rows(f["lexical"][rows] @ other(f["lexical"]).T, None, self.lexical_threshold)
+        else:
+            lexical = prune_rows(f["lexical"][rows] @ f["lexical"].T, self.lexical_top_k, self.lexical_threshold)
+            lexical = lexical if cols is None else lexical[:, cols]
+        return {
+            "semantic": (f["semantic"][rows] @ other(f["semantic"]).T).astype(np.float64),
+            "lexical": lexical.toarray(),
+            "numeric": f["numeric"][rows] @ other(f["numeric"]).T,
+            "categorical": f["categorical"][rows] @ other(f["categorical"]).T,
+        }
+
+    def resolve_weights(self, weights=None, recency_weight=None):
+        """Build weights overridden by the given ones; raises ValueError for invalid values."""
+        merged = dict(self.weights)
+        for name, w in (weights or {}).items():
+            if name not in merged:
+                raise ValueError(f"Unknown fusion component '{name}', expected one of {', '.join(COMPONENTS)}.")
+            if w < 0:
+                raise ValueError(f"Fusion weight for '{name}' must be non-negative.")
+            merged[name] = float(w)
+        if sum(merged.values()) <= 0:
+            raise ValueError("At least one fusion weight must be positive.")
+        recency_weight = self.recency_weight if recency_weight is None else float(recency_weight)
+        if not 0.0 <= recency_weight <= 1.0:
+            raise ValueError("recency_weight must be between 0 and 1.")
+        return merged, recency_weight
+
+    @staticmethod
+    def _config_key(weights, recency_weight):
+        return json.dumps([[round(weights[k], 9) for k in COMPONENTS], round(recency_weight, 9)])
+
+    def calibrate(self, weights=None, recency_weight=None):
+        """Exact normalisation constants for a weight set (one blockwise N × N pass), kept for later ``fuse`` calls."""
+        weights, recency_weight = self.resolve_weights(weights, recency_weight)
+        exact = self._compute_ranges(weights, recency_weight)
+        self.ranges.setdefault("calibrated", {})[self._config_key(weights, recency_weight)] = {
+            k: exact[k] for k in ("fused", "adjusted") if k in exact
+        }
+        return exact
+
+    def _fusion_ranges(self, weights, recency_weight):
+        """(fused_lo, fused_hi), (adjusted_lo, adjusted_hi) for a resolved weight set."""
+        key = self._config_key(weights, recency_weight)
+        if key == self._config_key(self.weights, self.recency_weight):
+            return self.ranges["fused"], self.ranges.get("adjusted")
+        calibrated = self.ranges.get("calibrated", {}).get(key)
+        if calibrated is not None:
+            return calibrated["fused"], calibrated.get("adjusted")
+        fused_lo = sum(w * self.ranges[name][0] for name, w in weights.items())
+        fused_hi = float(sum(w * self._diagonal[name] for name, w in weights.items()).max())
+        if self.recency is None:
+            return (fused_lo, fused_hi), None
+        adjusted = (recency_weight * self.recency.min() ** 2, (1 - recency_weight) + recency_weight * self.recency.max() ** 2)
+        return (fused_lo, fused_hi), adjusted
+
+    def fuse(self, rows, weights=None, recency_weight=None, cols=None):
+        """
+        Fused (k, N) similarity rows, or (N,) for a single row, for the given
+        weights; with ``cols`` only those columns, e.g. a (k, k) block
+        between candidates (see ``component_rows`` for what that saves).
+        """
+        single = np.ndim(rows) == 0
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        weights, recency_weight = self.resolve_weights(weights, recency_weight)
+        fused_range, adjusted_range = self._fusion_ranges(weights, recency_weight)
+        scores = _normalise(self._fuse_components(self.component_rows(rows, cols), weights), *fused_range)
+        if self.recency is not None:
+            col_recency = self.recency if cols is None else self.recency[cols]
+            scores = (1 - recency_weight) * scores + recency_weight * np.outer(self.recency[rows], col_recency)
+            scores = _normalise(scores, *adjusted_range)
+        return scores[0] if single else scores
+
+    @staticmethod
+    def _fuse_components(components, weights):
+        fused = np.zeros_like(components["semantic"])
+        for name, w in weights.items():
+            if w:
+                fused += w * components[name]
+        return fused
+
+    def _compute_ranges(self, weights, recency_weight, block_size=1024):
+        """
+        Global min/max of every component and of the fused/adjusted
+        matrices for ``weights``, computed block by block without
+        materialising N × N.
+        """
+        n = len(self)
+        ranges = {name: (np.inf, -np.inf) for name in (*COMPONENTS, "fused")}
+
+        def widen(name, values):
+            lo, hi = ranges[name]
+            ranges[name] = (min(lo, float(values.min())), max(hi, float(values.max())))
+
+        for start in range(0, n, block_size):
+            components = self.component_rows(np.arange(start, min(start + block_size, n)))
+            for name, values in components.items():
+                widen(name, values)
+            widen("fused", self._fuse_components(components, weights))
+
+        if self.recency is not None:
+            ranges["adjusted"] = (np.inf, -np.inf)
+            for start in range(0, n, block_size):
+                rows = np.arange(start, min(start + block_size, n))
+                fused = _normalise(self._fuse_components(self.component_rows(rows), weights), *ranges["fused"])
+                widen("adjusted", (1 - recency_weight) * fused + recency_weight * np.outer(self.recency[rows], self.recency))
+        return ranges
@@ -0,0 +1,197 @@
+"""
+Opt-in instrumentation for the recommendation hot path.
+
+Nothing is recorded until a sink is installed with ``set_sinks`` or a
+per-request ``Trace`` is active, so the default cost of ``stage`` is a
+context-variable lookup.
+
+    import cb_metrics
+    sink = cb_metrics.PrometheusSink()
+    cb_metrics.set_sinks(sink, cb_metrics.LogSink())
+    ...
+    print(sink.render())
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_sinks = ()
+_current_trace = ContextVar("anisense_trace", default=None)
+
+
+# -----------------------------
+# Sinks
+# -----------------------------
+class InMemorySink:
+    """Keeps a fixed-bucket histogram per stage and a total per counter."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, seconds):
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            hist["buckets"][bisect_left(self.buckets, seconds)] += 1
+            hist["sum"] += seconds
+            hist["count"] += 1
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        """Plain-dict copy, with a mean per stage for quick inspection."""
+        with self._lock:
+            stages = {
+                name: {"count": h["count"], "sum": h["sum"], "mean": h["sum"] / h["count"],
+                       "buckets": dict(zip([*map(str, self.buckets), "+Inf"], h["buckets"]))}
+                for name, h in self.histograms.items()
+            }
+            return {"stages": stages, "counters": dict(self.counters)}
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+class PrometheusSink(InMemorySink):
+    """In-memory histograms rendered in the Prometheus text exposition format."""
+
+    def __init__(self, namespace="anisense", buckets=DEFAULT_BUCKETS):
+        super().__init__(buckets)
+        self.namespace = namespace
+
+    def render(self):
+        ns = self.namespace
+        lines = [
+            f"# HELP {ns}_stage_seconds Time spent in each recommendation stage.",
+            f"# TYPE {ns}_stage_seconds histogram",
+        ]
+        with self._lock:
+            for name in sorted(self.histograms):
+                hist = self.histograms[name]
+                cumulative = 0
+                for bound, count in zip([*map(repr, self.buckets), "+Inf"], hist["buckets"]):
+                    cumulative += count
+                    lines.append(f'{ns}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{ns}_stage_seconds_sum{{stage="{name}"}} {hist["sum"]}')
+                lines.append(f'{ns}_stage_seconds_count{{stage="{name}"}} {hist["count"]}')
+            for name in sorted(self.counters):
+                lines.append(f"# TYPE {ns}_{name}_total counter")
+                lines.append(f"{ns}_{name}_total {self.counters[name]}")
+        return "\n".join(lines) + "\n"
+
+
+class LogSink:
+    """Emits one JSON log line per observation."""
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger("anisense.metrics")
+        self.level = level
+
+    def observe(self, name, seconds):
+        self.logger.log(self.level, json.dumps({"stage": name, "seconds": round(seconds, 6)}))
+
+    def incr(self, name, value=1):
+        self.logger.log(self.level, json.dumps({"counter": name, "value": value}))
+
+
+def set_sinks(*sinks):
+    """Install the sinks that receive every observation (none disables recording)."""
+    global _sinks
+    _sinks = tuple(sinks)
+
+
+def get_sinks():
+    return _sinks
+
+
+# -----------------------------
+# Per-request trace
+# -----------------------------
+class Trace:
+    """Stage durations and counters for a single request."""
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        # Stages nest (e.g. anilist_request inside trailers), so prefer the outer "total"
+        total = self.stages.get("total", sum(self.stages.values()))
+        return {
+            "stages_ms": {name: round(s * 1000, 3) for name, s in self.stages.items()},
+            "total_ms": round(total * 1000, 3),
+            "counters": dict(self.counters),
+        }
+
+
+@contextmanager
+def tracing(enabled=True):
+    """Make a fresh ``Trace`` current for the enclosed block (yields None when disabled)."""
+    if not enabled:
+        yield None
+        return
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+# -----------------------------
+# Recording
+# -----------------------------
+def observe(name, seconds):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.observe(name, seconds)
+    for sink in _sinks:
+        sink.observe(name, seconds)
+
+
+def incr(name, value=1):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.incr(name, value)
+    for sink in _sinks:
+        sink.incr(name, value)
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as ``name`` if anything is listening."""
+    if not _sinks and _current_trace.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
@@ -3,14 +3,33 @@ import numpy as np
 import joblib
 import re
 import requests
-from rapidfuzz import process
+from rapidfuzz import fuzz, process
 import os
 import json
+import logging
+import threading
+import contextvars
+import base64
+import secrets
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 
+import cb_artifacts
+import cb_fusion
+import cb_metrics
+import cb_relations
+import cb_search
+from cb_results import Recommendation, RecommendationError, RecommendationList, to_dataframe
+
+logger = logging.getLogger(__name__)
+
 
 TRAILER_CACHE_FILE = "trailer_cache.json"
 trailer_cache = {}
+# Trailer lookups run on worker threads when results are streamed
+_trailer_cache_lock = threading.RLock()
 
 
 def load_trailer_cache():
@@ -31,39 +50,46 @@ def load_trailer_cache():
 def save_trailer_cache():
     """Save trailer cache to file"""
     try:
-        with open(TRAILER_CACHE_FILE, 'w', encoding='utf-8') as f:
+        with _trailer_cache_lock, open(TRAILER_CACHE_FILE, 'w', encoding='utf-8') as f:
             json.dump(trailer_cache, f, ensure_ascii=False, indent=2)
     except Exception as e:
         print(f"Error saving trailer cache: {e}")
 
 
-def get_cached_trailer_id(anilist_id, media_type):
-    """Get trailer ID from cache if available and not expired"""
+# get_cached_trailer_id default that tells a miss apart from a cached "no trailer" (None)
+TRAILER_CACHE_MISS = object()
+
+
+def get_cached_trailer_id(anilist_id, media_type, default=None):
+    """Get trailer ID from cache if available and not expired, else ``default``"""
     cache_key = f"{anilist_id}_{media_type}"
 
-    if cache_key in trailer_cache:
-        cache_data = trailer_cache[cache_key]
+    cache_data = trailer_cache.get(cache_key)
+    if cache_data is not None:
         # Check if cache is still valid (30 days expiry)
         cache_time = datetime.fromisoformat(cache_data['timestamp'])
         if datetime.now() - cache_time < timedelta(days=30):
             return cache_data['trailer_id']
         else:
             # Remove expired cache entry
-            del trailer_cache[cache_key]
+            with _trailer_cache_lock:
+                trailer_cache.pop(cache_key, None)
 
-    return None
+    return default
 
 
-def set_cached_trailer_id(anilist_id, media_type, trailer_id):
-    """Store trailer ID in cache"""
+def set_cached_trailer_id(anilist_id, media_type, trailer_id, save=True):
+    """Store trailer ID in cache; ``save=False`` leaves writing the file to the caller (bulk prefetch)"""
     cache_key = f"{anilist_id}_{media_type}"
-    trailer_cache[cache_key] = {
-        'trailer_id': trailer_id,
-        'timestamp': datetime.now().isoformat(),
-        'media_type': media_type
-    }
-    # Save cache after each update (or you can batch save)
-    save_trailer_cache()
+    with _trailer_cache_lock:
+        trailer_cache[cache_key] = {
+            'trailer_id': trailer_id,
+            'timestamp': datetime.now().isoformat(),
+            'media_type': media_type
+        }
+        # Save cache after each update (or you can batch save)
+        if save:
+            save_trailer_cache()
 
 
 # Load cache when module is imported
@@ -144,8 +170,67 @@ def format_volumes(vol, status):
     return "N/A"
 
 
-def get_trailer_id(anilist_id, media_type):
-    """Fetch trailer ID from AniList API with caching"""
+# AniList allows about 90 requests per minute; every lookup goes through one shared budget
+ANILIST_REQUESTS_PER_MINUTE = 80
+ANILIST_BURST = 10
+ANILIST_MAX_ATTEMPTS = 3
+# Pause when a 429 carries no usable Retry-After
+ANILIST_RETRY_AFTER_SECONDS = 60.0
+# Longest an interactive lookup waits for a slot before giving up (uncached)
+TRAILER_MAX_WAIT_SECONDS = 10.0
+
+
+class RateLimiter:
+    """
+    Token bucket shared by threads: ``per_minute`` calls on average, up to
+    ``burst`` at once. ``pause`` holds every caller, e.g. for a Retry-After.
+    """
+
+    def __init__(self, per_minute, burst=1):
+        self.interval = 60.0 / per_minute
+        self.tolerance = (burst - 1) * self.interval
+        self._tat = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        """Wait for a slot; returns False, without waiting, when it would start after ``deadline``."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._tat - self.tolerance, self._paused_until)
+            if deadline is not None and start > deadline:
+                return False
+            self._tat = max(self._tat, start) + self.interval
+        if start > now:
+            time.sleep(start - now)
+        return True
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+anilist_limiter = RateLimiter(ANILIST_REQUESTS_PER_MINUTE, ANILIST_BURST)
+
+
+def _retry_after(response):
+    try:
+        return max(float(response.headers.get("Retry-After", "")), 1.0)
+    except ValueError:
+        return ANILIST_RETRY_AFTER_SECONDS
+
+
+def get_trailer_id(anilist_id, media_type, save=True, deadline=None):
+    """
+    Fetch trailer ID from AniList API with caching.
+
+    Calls are throttled by ``anilist_limiter``. A 429 pauses every lookup
+    for its Retry-After; 429s, 5xx and network errors are retried and, if
+    they persist, return None without caching it. Only an answer from
+    AniList (a trailer or none) is cached. No attempt starts after
+    ``deadline`` (a ``time.monotonic()`` value; default
+    ``TRAILER_MAX_WAIT_SECONDS`` from now).
+    """
     if not anilist_id or pd.isna(anilist_id):
         return None
 
@@ -156,10 +241,12 @@ def get_trailer_id(anilist_id, media_type):
         return None
 
     # Check cache first
-    cached_trailer = get_cached_trailer_id(media_id, media_type)
-    if cached_trailer is not None:
-        print(f"Using cached trailer ID for {media_id}")
+    cached_trailer = get_cached_trailer_id(media_id, media_type, TRAILER_CACHE_MISS)
+    if cached_trailer is not TRAILER_CACHE_MISS:
+        cb_metrics.incr("trailer_cache_hits")
+        logger.debug("Using cached trailer ID for %s", media_id)
         return cached_trailer
+    cb_metrics.incr("trailer_cache_misses")
 
     # If not in cache, fetch from API
     query = '''
@@ -179,44 +266,91 @@ def get_trailer_id(anilist_id, media_type):
     }
 
     url = 'https://graphql.anilist.co'
+    if deadline is None:
+        deadline = time.monotonic() + TRAILER_MAX_WAIT_SECONDS
+
+    for attempt in range(ANILIST_MAX_ATTEMPTS):
+        if not anilist_limiter.acquire(deadline):
+            cb_metrics.incr("anilist_throttled")
+            return None
+        try:
+            cb_metrics.incr("anilist_calls")
+            with cb_metrics.stage("anilist_request"):
+                response = requests.post(url, json={'query': query, 'variables': variables}, timeout=5)
+        except requests.exceptions.RequestException as e:
+            cb_metrics.incr("anilist_errors")
+            logger.warning("Request error fetching trailer for ID %s: %s", media_id, e)
+            anilist_limiter.pause(2 ** attempt)
+            continue
+
+        if response.status_code == 429:
+            cb_metrics.incr("anilist_rate_limited")
+            wait = _retry_after(response)
+            logger.warning("AniList rate limit reached, pausing trailer lookups for %.0fs", wait)
+            anilist_limiter.pause(wait)
+            continue
+        if response.status_code >= 500:
+            cb_metrics.incr("anilist_errors")
+            logger.warning("AniList error %s fetching trailer for ID %s", response.status_code, media_id)
+            anilist_limiter.pause(2 ** attempt)
+            continue
 
-    try:
-        response = requests.post(url, json={'query': query, 'variables': variables}, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-
-        # Check if we have valid trailer data
         trailer_id = None
-        if (data.get('data') and
-                data['data'].get('Media') and
-                data['data']['Media'].get('trailer') and
-                data['data']['Media']['trailer'].get('site') == 'youtube' and
-                data['data']['Media']['trailer'].get('id')):
-            trailer_id = data['data']['Media']['trailer']['id']
-
-        # Cache the result (even if None to avoid re-fetching failures)
-        set_cached_trailer_id(media_id, media_type, trailer_id)
+        try:
+            # 4xx other than 429 (e.g. 404 for an unknown id) is an answer: no trailer
+            if response.ok:
+                data = response.json()
+                # Check if we have valid trailer data
+                if (data.get('data') and
+                        data['data'].get('Media') and
+                        data['data']['Media'].get('trailer') and
+                        data['data']['Media']['trailer'].get('site') == 'youtube' and
+                        data['data']['Media']['trailer'].get('id')):
+                    trailer_id = data['data']['Media']['trailer']['id']
+        except ValueError as e:
+            cb_metrics.incr("anilist_errors")
+            logger.warning("Invalid response fetching trailer for ID %s: %s", media_id, e)
+            continue
+
+        # Cache the result (even if None to avoid re-fetching titles without a trailer)
+        set_cached_trailer_id(media_id, media_type, trailer_id, save)
 
         if trailer_id:
-            print(f"Fetched and cached trailer ID for {media_id}: {trailer_id}")
+            logger.debug("Fetched and cached trailer ID for %s: %s", media_id, trailer_id)
         else:
-            print(f"No trailer found for {media_id}, cached None")
-
+            logger.debug("No trailer found for %s, cached None", media_id)
         return trailer_id
 
-    except requests.exceptions.Timeout:
-        print(f"Timeout fetching trailer for ID {media_id}")
-        # Cache None to avoid repeated timeouts
-        set_cached_trailer_id(media_id, media_type, None)
-    except requests.exceptions.RequestException as e:
-        print(f"Request error fetching trailer for ID {media_id}: {e}")
-        set_cached_trailer_id(media_id, media_type, None)
-    except Exception as e:
-        print(f"Unexpected error fetching trailer for ID {media_id}: {e}")
-        set_cached_trailer_id(media_id, media_type, None)
-
     return None
 
+
+def prefetch_trailer_ids(items, workers=8, deadline=None):
+    """
+    Look up trailer ids for ``(anilist_id, media_type)`` pairs that are not
+    cached yet, ``workers`` at a time within the ``anilist_limiter`` rate,
+    and write the cache file once at the end. No new lookups start after
+    ``deadline`` (a ``time.monotonic()`` value; None waits for the rate
+    limit as long as it takes). Returns the number of pairs answered (and
+    cached); the others are left for later requests.
+    """
+    pending = []
+    for anilist_id, media_type in dict.fromkeys(items):
+        if anilist_id and not pd.isna(anilist_id) and f"{int(anilist_id)}_{media_type}" not in trailer_cache:
+            pending.append((anilist_id, media_type))
+    if not pending:
+        return 0
+
+    wait_until = deadline if deadline is not None else float("inf")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # One round of lookups in flight at a time, so the deadline is honoured
+        for start in range(0, len(pending), workers):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            batch = pending[start:start + workers]
+            list(executor.map(lambda item: get_trailer_id(*item, save=False, deadline=wait_until), batch))
+    save_trailer_cache()
+    return sum(f"{int(anilist_id)}_{media_type}" in trailer_cache for anilist_id, media_type in pending)
+
 manual_aliases = {
     "aot": "attack on titan",
     "jjk": "jujutsu kaisen",
@@ -228,128 +362,1142 @@ manual_aliases = {
 # -----------------------------
 # Load Model Components
 # -----------------------------
+# Versioned artifacts (see cb_artifacts); without a manifest the paths below are used
+MANIFEST_PATH = cb_artifacts.MANIFEST_PATH
 ANIME_PKL = "data/anime_cb_data_merged.pkl"
 SIM_NPY = "data/fused_sim_refined(all-mpnet-base-v2).npy"
 TFIDF_JOB = "data/tfidf_vectorizer_merged.joblib"
+# Per-component factors for query-time fusion weights, loaded on first use
+FUSION_NPZ = "data/fusion_components.npz"
+# Catalogue TF-IDF rows for free-text search, loaded on first use
+TFIDF_MATRIX_NPZ = "data/tfidf_matrix.npz"
+# AniList relation edges (cb_relations), loaded on first use
+RELATION_GRAPH_NPZ = "data/relation_graph.npz"
+
+
+def current_manifest():
+    """Artifacts to load: ``MANIFEST_PATH`` when it exists, else the path constants (unversioned)."""
+    if os.path.exists(MANIFEST_PATH):
+        return cb_artifacts.ArtifactManifest.read(MANIFEST_PATH)
+    return cb_artifacts.ArtifactManifest(None, {
+        "anime_data": ANIME_PKL, "fused_sim": SIM_NPY, "tfidf_vectorizer": TFIDF_JOB,
+        "fusion_components": FUSION_NPZ, "tfidf_matrix": TFIDF_MATRIX_NPZ, "relation_graph": RELATION_GRAPH_NPZ,
+    })
+
+
+def load_cb_model(manifest=None):
+    manifest = manifest or current_manifest()
+    manifest.verify()
+    anime_df = pd.read_pickle(manifest.paths["anime_data"])
+    similarity_matrix = np.load(manifest.paths["fused_sim"])
+    vectorizer = joblib.load(manifest.paths["tfidf_vectorizer"])
+    return anime_df, similarity_matrix, vectorizer
 
 
-def load_cb_model():
-    anime_df = pd.read_pickle(ANIME_PKL)
-    similarity_matrix = np.load(SIM_NPY)
-    vectorizer = joblib.load(TFIDF_JOB)
-    return anime_df, similarity_matrix, vectorizer
+TITLE_COLUMNS = ["display_title", "title_romaji", "title_english", "title_native"]
+
+
+# -----------------------------
+# Catalogue schema
+# -----------------------------
+# Low-cardinality labels, stored as categoricals
+CATEGORY_COLUMNS = ["fetched_type", "format", "season", "country", "status", "source"]
+# Only read to rebuild the TF-IDF matrix when TFIDF_MATRIX_NPZ is missing
+TEXT_INDEX_COLUMN = "combined_text"
+
+
+def _frame_mb(df):
+    return df.memory_usage(index=True, deep=True).sum() / 2 ** 20
+
+
+def _compact_column(name, col):
+    if name in CATEGORY_COLUMNS and not isinstance(col.dtype, pd.CategoricalDtype):
+        # Categoricals read missing values back as NaN, so only convert when that is what is stored
+        missing = col[col.isna()]
+        if col.nunique() <= len(col) // 2 and all(isinstance(v, float) for v in missing):
+            return col.astype("category")
+    elif pd.api.types.is_integer_dtype(col.dtype):
+        return pd.to_numeric(col, downcast="integer")
+    elif pd.api.types.is_float_dtype(col.dtype) and col.dtype != np.float32:
+        # Only when every value survives the round trip (counts, years, scores)
+        small = col.astype(np.float32)
+        if np.array_equal(small.to_numpy(dtype=np.float64), col.to_numpy(), equal_nan=True):
+            return small
+    return col
+
+
+def compact_catalogue(anime_df, keep_text=True):
+    """
+    Load-time schema for the catalogue: keeps only the columns read at query
+    time (plus ``combined_text`` when ``keep_text``), stores the
+    low-cardinality labels as categoricals and downcasts numbers where no
+    value changes. Values read back are the same, so are the results.
+
+    Returns ``(anime_df, report)`` with the memory before and after.
+    """
+    used = set(_RESULT_COLUMNS).union(TITLE_COLUMNS, FilterIndex.CATEGORICAL, ["start_year"])
+    if keep_text:
+        used.add(TEXT_INDEX_COLUMN)
+    kept = [c for c in anime_df.columns if c in used]
+    compact = pd.DataFrame({c: _compact_column(c, anime_df[c]) for c in kept}, index=anime_df.index)
+    report = {
+        "before_mb": round(float(_frame_mb(anime_df)), 2),
+        "after_mb": round(float(_frame_mb(compact)), 2),
+        "dropped": [c for c in anime_df.columns if c not in used],
+        "dtypes": {c: str(compact[c].dtype) for c in kept if compact[c].dtype != anime_df[c].dtype},
+    }
+    logger.info("Catalogue %.1f MB -> %.1f MB (dropped %s)", report["before_mb"], report["after_mb"],
+                ", ".join(report["dropped"]) or "nothing")
+    return compact, report
+
+
+def build_alias_index(anime_df):
+    """
+    Flattened (alias, row) pairs for every title column, in catalogue order.
+
+    Same normalisation as before: empty titles are skipped, the rest are
+    stripped and lower-cased.
+    """
+    columns = [anime_df[c].tolist() if c in anime_df.columns else [""] * len(anime_df) for c in TITLE_COLUMNS]
+    alias_titles, alias_rows = [], []
+    for idx, titles in zip(anime_df.index, zip(*columns)):
+        for t in titles:
+            if t:
+                alias_titles.append(str(t).strip().lower())
+                alias_rows.append(idx)
+    return alias_titles, np.asarray(alias_rows, dtype=np.int64)
+
+
+def _alias_map(alias_titles, alias_rows, keep=None):
+    """alias -> row for the rows in ``keep`` (a boolean row mask); later rows win on duplicates."""
+    if keep is None:
+        return dict(zip(alias_titles, alias_rows.tolist()))
+    selected = np.flatnonzero(keep[alias_rows])
+    return dict(zip([alias_titles[k] for k in selected], alias_rows[selected].tolist()))
+
+
+def _match_codes(values):
+    """
+    Integer code per row such that two rows share a code exactly when the
+    rerank's ``safe_list`` sets intersect; -1 for rows that never match.
+    """
+    keys = [str(v) if v else None for v in values]
+    codes, _ = pd.factorize(pd.Series(keys, dtype=object), use_na_sentinel=True)
+    return codes.astype(np.int64)
+
+
+class FilterIndex:
+    """
+    Precomputed row masks for the catalogue filters.
+
+    Categorical columns are factorized once, so a filter is an integer
+    comparison instead of a string pass over the frame, and every distinct
+    filter combination is materialised once and then reused. All
+    (media_type, manga_format) combinations, including ``ALL``, are built
+    up front.
+    """
+
+    CATEGORICAL = ("fetched_type", "format", "country", "status", "season")
+
+    def __init__(self, anime_df):
+        self.n = len(anime_df)
+        self.codes, self.levels = {}, {}
+        for col in self.CATEGORICAL:
+            if col in anime_df.columns:
+                codes, levels = pd.factorize(anime_df[col].str.upper(), use_na_sentinel=True)
+                self.codes[col] = codes
+                self.levels[col] = {level: i for i, level in enumerate(levels)}
+        self.start_year = (anime_df["start_year"].to_numpy(dtype=np.float64, na_value=np.nan)
+                           if "start_year" in anime_df.columns else None)
+        self._masks = {}
+        self._rows = {}
+        for media_type in [None, *self.levels.get("fetched_type", {})]:
+            self.mask(media_type)
+        for manga_format in ["ALL", *self.levels.get("format", {})]:
+            self.mask("MANGA", manga_format)
+
+    @staticmethod
+    def key(media_type=None, manga_format=None, **extra):
+        """Normalised cache key; the format filter only applies to MANGA, as in the UI."""
+        fmt = manga_format.upper() if media_type == "MANGA" and manga_format and manga_format.upper() != "ALL" else None
+        extras = tuple(sorted((k, v.upper() if isinstance(v, str) else v) for k, v in extra.items() if v is not None))
+        return (media_type.upper() if media_type else None, fmt, extras)
+
+    def _equals(self, col, value):
+        code = self.levels.get(col, {}).get(value)
+        if code is None:
+            return np.zeros(self.n, dtype=bool)
+        return self.codes[col] == code
+
+    def mask(self, media_type=None, manga_format=None, **extra):
+        """
+        Boolean row mask. ``extra`` accepts ``country``, ``status``,
+        ``season`` (exact, case-insensitive) and ``year_range=(lo, hi)``.
+        """
+        key = self.key(media_type, manga_format, **extra)
+        cached = self._masks.get(key)
+        if cached is not None:
+            return cached
+        media, fmt, extras = key
+        keep = np.ones(self.n, dtype=bool)
+        if media:
+            keep &= self._equals("fetched_type", media)
+        if fmt:
+            keep &= self._equals("format", fmt)
+        for name, value in extras:
+            if name == "year_range":
+                lo, hi = value
+                keep &= (self.start_year >= lo) & (self.start_year <= hi)
+            else:
+                keep &= self._equals(name, value)
+        keep.flags.writeable = False
+        self._masks[key] = keep
+        return keep
+
+    def rows(self, media_type=None, manga_format=None, **extra):
+        """Sorted row indices matching the filter."""
+        key = self.key(media_type, manga_format, **extra)
+        rows = self._rows.get(key)
+        if rows is None:
+            rows = self._rows[key] = np.flatnonzero(self.mask(media_type, manga_format, **extra))
+        return rows
+
+
+class CBModel:
+    """Loaded artifacts plus the lookup structures derived from them, built once."""
+
+    def __init__(self, anime_df, similarity_matrix, vectorizer=None, manifest=None):
+        self.anime_df = anime_df
+        self.similarity_matrix = similarity_matrix
+        self.vectorizer = vectorizer
+        self.alias_titles, self.alias_rows = build_alias_index(anime_df)
+        self.genre_codes = _match_codes(anime_df["genres"].tolist())
+        self.tag_codes = _match_codes(anime_df["tags"].tolist())
+        self.row_by_id = {int(v): i for i, v in enumerate(anime_df["id"].tolist()) if not pd.isna(v)}
+        self.filters = FilterIndex(anime_df)
+        self.catalogue_report = None
+        self.manifest = manifest
+        self.version = manifest.version if manifest is not None else None
+        self._alias_lookups = {}
+        self._fusion = None
+        self._text_index = None
+        self._relations = None
+        # (seed row, filter key, top_n, ranked_size, hide_related, diversity) -> (rows, sims) with the build-time weights; LRU
+        self._results = OrderedDict()
+        self._results_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, manifest=None):
+        manifest = manifest or current_manifest()
+        anime_df, similarity_matrix, vectorizer = load_cb_model(manifest)
+        text_matrix = manifest.paths.get("tfidf_matrix", TFIDF_MATRIX_NPZ)
+        anime_df, report = compact_catalogue(anime_df, keep_text=not os.path.exists(text_matrix))
+        model = cls(anime_df, similarity_matrix, vectorizer, manifest)
+        model.catalogue_report = report
+        if manifest.version is not None:
+            model.load_optional_artifacts()
+        return model
+
+    def load_optional_artifacts(self):
+        """
+        Load the optional artifacts the manifest lists now instead of on
+        first use. ``load_cb_model`` has just verified their checksums, and a
+        model must never read files of a version published after it.
+        """
+        for key, attr in (("fusion_components", "fusion"), ("tfidf_matrix", "text_index"),
+                          ("relation_graph", "relations")):
+            if key in self.manifest.paths:
+                getattr(self, attr)
+
+    def __len__(self):
+        return len(self.anime_df)
+
+    def artifact_path(self, key, default):
+        """Path of an optional artifact of this model's version."""
+        return self.manifest.paths.get(key, default) if self.manifest is not None else default
+
+    @property
+    def fusion(self):
+        """Component factors for query-time re-fusion (``cb_fusion.FusionComponents``)."""
+        if self._fusion is None:
+            fusion = cb_fusion.FusionComponents.load(self.artifact_path("fusion_components", FUSION_NPZ))
+            if len(fusion) != len(self):
+                raise ValueError("The fusion components do not match the catalogue; rebuild the artifacts with similarity.ipynb.")
+            self._fusion = fusion
+        return self._fusion
+
+    @property
+    def text_index(self):
+        """Inverted TF-IDF index for free-text search (``cb_search.TextIndex``)."""
+        if self._text_index is None:
+            if self.vectorizer is None:
+                raise FileNotFoundError("Free-text search needs the TF-IDF vectorizer.")
+            texts = self.anime_df["combined_text"].tolist() if "combined_text" in self.anime_df.columns else None
+            index = cb_search.TextIndex.load(self.vectorizer, self.artifact_path("tfidf_matrix", TFIDF_MATRIX_NPZ), texts)
+            if len(index) != len(self):
+                raise ValueError("The TF-IDF matrix does not match the catalogue; rebuild the artifacts with similarity.ipynb.")
+            self._text_index = index
+        return self._text_index
+
+    @property
+    def relations(self):
+        """Typed AniList relation edges of the catalogue (``cb_relations.RelationGraph``)."""
+        if self._relations is None:
+            graph = cb_relations.RelationGraph.load(self.artifact_path("relation_graph", RELATION_GRAPH_NPZ))
+            if not np.array_equal(graph.ids, self.anime_df["id"].to_numpy(dtype=np.int64)):
+                raise ValueError("The relation graph does not match the catalogue; rebuild the artifacts with similarity.ipynb.")
+            self._relations = graph
+        return self._relations
+
+    def similarity_rows(self, rows, fusion_weights=None, recency_weight=None):
+        """
+        Similarity row(s) for ``rows``: straight from the shipped matrix, or
+        re-fused from the components when weights are overridden.
+        """
+        if fusion_weights is None and recency_weight is None:
+            return np.asarray(self.similarity_matrix[rows], dtype=np.float64)
+        with cb_metrics.stage("fuse"):
+            return self.fusion.fuse(rows, fusion_weights, recency_weight)
+
+    def similarity_block(self, rows, fusion_weights=None, recency_weight=None):
+        """(k, k) similarities between ``rows``, e.g. between the candidates of a ranking; weights as in ``similarity_rows``."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if fusion_weights is None and recency_weight is None:
+            return np.asarray(self.similarity_matrix[np.ix_(rows, rows)], dtype=np.float64)
+        with cb_metrics.stage("fuse"):
+            return self.fusion.fuse(rows, fusion_weights, recency_weight, cols=rows)
+
+    def alias_lookup(self, media_type=None, manga_format=None, **extra):
+        """(alias -> row, alias list) restricted to a filter, cached per filter."""
+        key = FilterIndex.key(media_type, manga_format, **extra)
+        lookup = self._alias_lookups.get(key)
+        if lookup is None:
+            keep = None if key == FilterIndex.key() else self.filters.mask(media_type, manga_format, **extra)
+            alias_map = _alias_map(self.alias_titles, self.alias_rows, keep)
+            lookup = self._alias_lookups[key] = (alias_map, list(alias_map.keys()))
+        return lookup
+
+    def cached_ranking(self, key):
+        with self._results_lock:
+            cached = self._results.get(key)
+            if cached is None:
+                return None
+            self._results.move_to_end(key)
+        rows, sims = cached
+        return list(zip(rows.tolist(), sims.tolist()))
+
+    def store_ranking(self, key, final_scores):
+        # Arrays instead of the tuple list: ~3 KB for a 200-item ranking instead of ~20 KB
+        rows = np.fromiter((i for i, _ in final_scores), dtype=np.int64, count=len(final_scores))
+        sims = np.fromiter((sim for _, sim in final_scores), dtype=np.float64, count=len(final_scores))
+        with self._results_lock:
+            self._results[key] = (rows, sims)
+            self._results.move_to_end(key)
+            while len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+
+
+RESULT_CACHE_SIZE = 1024
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def relations_available():
+    """Whether the current artifacts include the relation graph that ``hide_related`` needs."""
+    model = _model
+    if model is not None:
+        return model._relations is not None or os.path.exists(model.artifact_path("relation_graph", RELATION_GRAPH_NPZ))
+    return os.path.exists(current_manifest().paths.get("relation_graph", RELATION_GRAPH_NPZ))
+
+
+def get_cb_model():
+    """
+    Process-wide CBModel, loaded on first use. Callers hold on to the
+    returned model for the whole request, so a hot swap never changes the
+    model under a request that is already running.
+    """
+    global _model
+    model = _model
+    if model is None:
+        with _model_lock:
+            if _model is None:
+                _model = CBModel.load()
+            model = _model
+    return model
+
+
+# -----------------------------
+# Hot reload
+# -----------------------------
+RELOAD_POLL_SECONDS = 30.0
+
+# name -> callback(model), called after every swap
+_reload_listeners = {}
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def add_reload_listener(name, callback):
+    """Register ``callback(model)`` to run after each swap, e.g. to clear a UI cache; one per ``name``."""
+    _reload_listeners[name] = callback
+
+
+def reload_cb_model(manifest=None, prepare=None):
+    """
+    Load the current artifacts into a new CBModel and swap it in.
+
+    The new model comes with empty result, alias and filter caches, so
+    swapping it in is also the invalidation. Requests already running keep
+    the model they started with. ``prepare(model)`` runs before the swap
+    (e.g. ``cb_warmup.warm_up``). If loading fails, the current model is
+    kept and the error propagates.
+    """
+    global _model
+    new_model = CBModel.load(manifest)
+    if prepare is not None:
+        prepare(new_model)
+    with _model_lock:
+        old_model, _model = _model, new_model
+    logger.info("Swapped model version %s -> %s", old_model.version if old_model else None, new_model.version)
+    for name, callback in list(_reload_listeners.items()):
+        try:
+            callback(new_model)
+        except Exception:
+            logger.exception("Reload listener %s failed", name)
+    return new_model
+
+
+class ArtifactWatcher(threading.Thread):
+    """Polls ``MANIFEST_PATH`` and hot-swaps the model when its version changes."""
+
+    def __init__(self, interval=RELOAD_POLL_SECONDS, prepare=None):
+        super().__init__(name="cb-artifact-watcher", daemon=True)
+        self.interval = interval
+        self.prepare = prepare
+        self.failed_version = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def check(self):
+        """Reload if a new, not previously failed version is published; returns True on a swap."""
+        current = _model
+        if current is None or not os.path.exists(MANIFEST_PATH):
+            return False
+        manifest = cb_artifacts.ArtifactManifest.read(MANIFEST_PATH)
+        if manifest.version in (current.version, self.failed_version):
+            return False
+        logger.info("New artifact version %s, loading in the background", manifest.version)
+        try:
+            reload_cb_model(manifest, self.prepare)
+        except Exception:
+            # Don't retry (and re-hash) a broken version every poll
+            self.failed_version = manifest.version
+            raise
+        return True
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Hot reload failed, keeping version %s", getattr(_model, "version", None))
+
+
+def start_artifact_watcher(interval=RELOAD_POLL_SECONDS, prepare=None):
+    """Start the ``ArtifactWatcher`` once per process; returns it."""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = ArtifactWatcher(interval, prepare)
+            _watcher.start()
+    return _watcher
+
 
 def find_best_match(query, anime_titles):
     match, score, idx = process.extractOne(query, anime_titles)
     return match, score, idx
 
-# -----------------------------
-# Fuzzy Match
-# -----------------------------
+
+def covers_query(query, title):
+    """
+    Whether ``title`` accounts for the whole of ``query``: close overall, or
+    the query is (a typo of) part of the title ("shingeki"). WRatio alone
+    also scores 90 for a description that merely contains a title ("dark
+    fantasy revenge with a time loop" vs "Revenge").
+    """
+    return fuzz.ratio(query, title) >= 60 or (len(query) <= len(title) and fuzz.partial_ratio(query, title) >= 90)
+
+
+def resolve_title(query, alias_map, choices=None, strict=False):
+    """
+    Catalogue row for a free-typed title (manual aliases + fuzzy match), or
+    None below the cutoff. With ``strict`` the match must also pass
+    ``covers_query``, so descriptions are left to the text search.
+    """
+    raw_query = query.strip().lower()
+    normalized_query = manual_aliases.get(raw_query, raw_query)
+    with cb_metrics.stage("find_best_match"):
+        match, score, _ = find_best_match(normalized_query, choices if choices is not None else list(alias_map.keys()))
+    if score < 60 or (strict and not covers_query(normalized_query, match)):
+        return None
+    return alias_map[match]
+
 
 # -----------------------------
-# Main Recommendation Function
+# Ranking
 # -----------------------------
-def get_cb_recommendations(anime_name, top_n=10, media_type=None, manga_format=None):
-    anime_df, similarity_matrix, _ = load_cb_model()
-    df = anime_df.copy()
-    df["title_aliases"] = df.apply(lambda row: safe_list([
-        row.get("display_title", ""),
-        row.get("title_romaji", ""),
-        row.get("title_english", ""),
-        row.get("title_native", "")
-    ]), axis=1)
-
-    df["normalized_aliases"] = df["title_aliases"].apply(
-        lambda titles: [t.strip().lower() for t in titles if isinstance(t, str)]
-    )
+# Candidates the diversity stage chooses from (+ 19, like the rerank pool)
+DIVERSITY_POOL = 200
+
+
+def _top_candidates(scores, k):
+    """Indices of the ``k`` highest finite scores, best first (ties by catalogue order)."""
+    k = min(k, int(np.isfinite(scores).sum()))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.lexsort((top, -scores[top]))]
+
+
+def rerank_block(model, query_rows, candidates, sims, top_n):
+    """
+    Genre/tag-aware reordering of a block of candidate lists.
+
+    ``query_rows`` is (B,) seed rows, or (B, S) for several seeds per query
+    with -1 padding. ``candidates`` / ``sims`` are (B, K) arrays ordered by
+    similarity, -1 padded. The first four genre matches keep their
+    similarity order; the rest are ordered by
+    ``0.4 * genre + 0.2 * tag + 0.4 * sim``. Returns (B, top_n) rows (-1
+    padded) and their similarities in final order.
+    """
+    query_rows = np.asarray(query_rows, dtype=np.int64)
+    if query_rows.ndim == 1:
+        query_rows = query_rows[:, None]
+    valid = candidates >= 0
+    safe = np.where(valid, candidates, 0)
+
+    def matches(codes):
+        q = np.where(query_rows >= 0, codes[np.maximum(query_rows, 0)], -1)
+        hit = (codes[safe][:, :, None] == q[:, None, :]) & (q[:, None, :] >= 0)
+        return (hit.any(axis=2) & valid).astype(np.int64)
+
+    g = matches(model.genre_codes)
+    t = matches(model.tag_codes)
+
+    genre_top = (g > 0) & (np.cumsum(g > 0, axis=1) <= 4)
+    combined = np.where(genre_top | ~valid, -np.inf, g * 0.4 + t * 0.2 + sims * 0.4)
+    k = candidates.shape[1]
+    combined_rank = np.empty_like(candidates)
+    np.put_along_axis(combined_rank, np.argsort(-combined, axis=1, kind="stable"), np.arange(k)[None, :], axis=1)
+    key = np.where(genre_top, np.arange(k)[None, :], np.where(valid, k + combined_rank, 3 * k))
+
+    final = np.argsort(key, axis=1, kind="stable")[:, :top_n]
+    final_valid = np.take_along_axis(valid, final, axis=1)
+    picked = np.where(final_valid, np.take_along_axis(candidates, final, axis=1), -1)
+    picked_sims = np.where(final_valid, np.take_along_axis(sims, final, axis=1), 0.0)
+    return picked, picked_sims
+
+
+def mmr_select(relevance, pair_sims, k, diversity):
+    """
+    Maximal marginal relevance order of a candidate block.
+
+    Picks, one at a time, the candidate with the highest
+    ``(1 - diversity) * relevance - diversity * max(similarity to the picked ones)``.
+    ``pair_sims`` is the (n, n) candidate-to-candidate block. Each pick
+    updates the running maximum with one row of the block, so the cost is
+    ``k`` vectorised passes over ``n`` values. Ties go to the earlier
+    candidate. Returns the positions of the first ``k`` picks, in order.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    picked = np.empty(max(k, 0), dtype=np.int64)
+    gain = (1.0 - diversity) * np.asarray(relevance, dtype=np.float64)
+    penalty = diversity * np.asarray(pair_sims, dtype=np.float64)
+    redundancy = np.full(n, -np.inf)
+    marginal = gain.copy()
+    for t in range(k):
+        j = int(marginal.argmax())
+        picked[t] = j
+        gain[j] = -np.inf
+        np.maximum(redundancy, penalty[j], out=redundancy)
+        np.subtract(gain, redundancy, out=marginal)
+    return picked
+
+
+def _final_scores(picked, picked_sims):
+    """``[(row, sim), ...]`` for one reranked row, dropping the padding."""
+    n = int((picked >= 0).sum())
+    return list(zip(picked[:n].tolist(), picked_sims[:n].tolist()))
+
+
+def _rerank_pages(model, query_rows, candidates, sims, top_n, ranked_size=None, pool=None):
+    """
+    Rerank the first ``top_n`` from the usual top_n + 19 pool (or the first
+    ``pool`` candidates). With ``ranked_size``, the rest of a
+    ``ranked_size`` rerank over the whole pool is appended, minus what the
+    first page already shows. The first page is then the same with or
+    without pagination.
+    """
+    pool = pool or top_n + 19
+    picked, picked_sims = rerank_block(model, query_rows, candidates[None, :pool], sims[None, :pool], top_n)
+    final_scores = _final_scores(picked[0], picked_sims[0])
+    if ranked_size and ranked_size > top_n:
+        picked, picked_sims = rerank_block(model, query_rows, candidates[None, :], sims[None, :], ranked_size)
+        shown = {i for i, _ in final_scores}
+        rest = [item for item in _final_scores(picked[0], picked_sims[0]) if item[0] not in shown]
+        final_scores += rest[:ranked_size - len(final_scores)]
+    return final_scores
+
+
+def _no_match(anime_name):
+    return RecommendationError("no_match", f"No close match found for '{anime_name}'.")
+
+
+def _empty_filter():
+    return RecommendationError("empty_filter", "No items match the selected filter.")
+
+
+def _request_error(e):
+    """Structured error for a rejected fusion setting (ValueError) or a missing optional artifact."""
+    return RecommendationError("missing_artifact" if isinstance(e, FileNotFoundError) else "invalid_argument", str(e))
+
+
+def _rank_recommendations(anime_name, top_n, media_type, manga_format, fusion_weights=None, recency_weight=None,
+                          ranked_size=None, hide_related=False, diversity=None, strict=False, model=None):
+    """
+    Resolve the query and rank candidates; returns (anime_df, [(idx, sim), ...]),
+    a ``RecommendationError``, or None when no title matches the query. With
+    ``ranked_size`` the list continues past ``top_n`` (see ``_rerank_pages``).
+    With ``hide_related`` the titles of the seed's franchise (its connected
+    component in ``model.relations``) are left out. With ``diversity`` the
+    list is chosen by ``mmr_select`` from the top ``DIVERSITY_POOL``
+    candidates before the genre/tag rerank orders it. ``strict`` is passed to
+    ``resolve_title``.
+    Rankings with the build-time weights are kept in the model's LRU per
+    seed title and filter (see ``warm_ranking``). ``model`` defaults
+    to the current one.
+    """
+    with cb_metrics.stage("load_cb_model"):
+        model = model if model is not None else get_cb_model()
+    if diversity is not None and not 0.0 <= diversity <= 1.0:
+        return _request_error(ValueError("diversity must be between 0 and 1."))
+    diversity = diversity or None
 
     # Filtering
-    if media_type:
-        df = df[df["fetched_type"].str.upper() == media_type.upper()]
-    if media_type == "MANGA" and manga_format and manga_format.upper() != "ALL":
-        df = df[df["format"].str.upper() == manga_format.upper()]
-    if df.empty:
-        return pd.DataFrame([{"error": "No items match the selected filter."}])
-
-    raw_query = anime_name.strip().lower()
-    normalized_query = manual_aliases.get(raw_query, raw_query)
+    with cb_metrics.stage("filter"):
+        keep = model.filters.mask(media_type, manga_format)
+    if not keep.any():
+        return _empty_filter()
 
     # Fuzzy match
-    alias_map = {}
-    for idx, aliases in df["normalized_aliases"].items():
-        for title in aliases:
-            alias_map[title] = idx
-    match, score, _ = find_best_match(normalized_query, list(alias_map.keys()))
-    if score < 60:
-        return pd.DataFrame([{"error": f"No close match found for '{anime_name}'."}])
-    true_idx = alias_map[match]
-
-    # Similarities
-    sim_scores = list(enumerate(similarity_matrix[true_idx]))
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-    sim_scores = [x for x in sim_scores if x[0] in df.index][1: top_n + 20]
-
-    query_genres = set(safe_list(anime_df.loc[true_idx]["genres"]))
-    query_tags = set(safe_list(anime_df.loc[true_idx]["tags"]))
-
-    def genre_match_score(idx):
-        target_genres = set(safe_list(anime_df.loc[idx]["genres"]))
-        return len(query_genres & target_genres)
-
-    def tag_match_score(idx):
-        target_tags = set(safe_list(anime_df.loc[idx]["tags"]))
-        return len(query_tags & target_tags)
-
-    def combined_score(idx, sim):
-        g_score = genre_match_score(idx)
-        t_score = tag_match_score(idx)
-        return g_score * 0.4 + t_score * 0.2 + sim * 0.4
-
-    genre_filtered = [x for x in sim_scores if genre_match_score(x[0]) > 0]
-    genre_top = genre_filtered[:4]
-    remaining = [x for x in sim_scores if x not in genre_top]
-    remaining = sorted(remaining, key=lambda x: combined_score(x[0], x[1]), reverse=True)
-    final_scores = genre_top + remaining[:top_n - len(genre_top)]
+    with cb_metrics.stage("build_aliases"):
+        alias_map, choices = model.alias_lookup(media_type, manga_format)
+    true_idx = resolve_title(anime_name, alias_map, choices, strict)
+    if true_idx is None:
+        return None
+
+    cache_key = None
+    if fusion_weights is None and recency_weight is None:
+        cache_key = (true_idx, FilterIndex.key(media_type, manga_format), top_n, ranked_size, hide_related, diversity)
+        final_scores = model.cached_ranking(cache_key)
+        if final_scores is not None:
+            cb_metrics.incr("result_cache_hits")
+            return model.anime_df, final_scores
+        cb_metrics.incr("result_cache_misses")
+
+    # Similarities: best candidates inside the precomputed mask; the first one is the seed itself
+    with cb_metrics.stage("sort"):
+        try:
+            row = model.similarity_rows(true_idx, fusion_weights, recency_weight)
+            related = model.relations.franchise_rows(true_idx) if hide_related else None
+        except (ValueError, FileNotFoundError) as e:
+            return _request_error(e)
+        scores = np.where(keep, row, -np.inf)
+        if related is not None:
+            scores[related] = -np.inf
+        size = max(top_n, ranked_size or 0)
+        # Same pool with and without pagination, so the diversified first page is too
+        candidates = _top_candidates(scores, max(size, DIVERSITY_POOL if diversity else 0) + 20)[1:]
+
+    pool = None
+    if diversity:
+        with cb_metrics.stage("diversify"):
+            try:
+                block = model.similarity_block(candidates, fusion_weights, recency_weight)
+            except (ValueError, FileNotFoundError) as e:
+                return _request_error(e)
+            picked = mmr_select(scores[candidates], block, size, diversity)
+            # The first page is exactly the first top_n picks; each part goes to the rerank in similarity order
+            candidates = candidates[np.concatenate([np.sort(picked[:top_n]), np.sort(picked[top_n:])])]
+        pool = top_n
+
+    with cb_metrics.stage("rerank"):
+        final_scores = _rerank_pages(model, [true_idx], candidates, scores[candidates], top_n, ranked_size, pool)
+
+    if cache_key is not None:
+        model.store_ranking(cache_key, final_scores)
+    return model.anime_df, final_scores
+
+
+def _rank_text_search(query, top_n, media_type, manga_format, rerank=True, ranked_size=None):
+    """Free-text ranking with the TF-IDF index; same return contract as ``_rank_recommendations``."""
+    with cb_metrics.stage("load_cb_model"):
+        model = get_cb_model()
+
+    with cb_metrics.stage("filter"):
+        keep = model.filters.mask(media_type, manga_format)
+    if not keep.any():
+        return _empty_filter()
+
+    with cb_metrics.stage("text_search"):
+        try:
+            index = model.text_index
+        except FileNotFoundError as e:
+            return _request_error(e)
+        rows, scores = index.search(clean_text(query).lower(), keep)
+        if not len(rows):
+            return RecommendationError("no_match", f"No titles match '{query}'.")
+        size = max(top_n, ranked_size or 0)
+        top = _top_candidates(scores, size + 19 if rerank else size)
+        candidates, sims = rows[top], scores[top]
+
+    if not rerank:
+        return model.anime_df, list(zip(candidates.tolist(), sims.tolist()))
+
+    with cb_metrics.stage("rerank"):
+        # There is no seed title: the best text match stands in for it
+        final_scores = _rerank_pages(model, candidates[:1], candidates, sims, top_n, ranked_size)
+
+    return model.anime_df, final_scores
+
+
+# -----------------------------
+# Main Recommendation Function
+# -----------------------------
+def get_cb_recommendations(anime_name, top_n=10, media_type=None, manga_format=None, trace=False,
+                           fusion_weights=None, recency_weight=None, text_fallback=False, paginate=False,
+                           hide_related=False, diversity=None, as_frame=True):
+    """
+    Top-N similar titles for ``anime_name``.
+
+    Returns a DataFrame (one row per result, metadata in ``attrs``; errors as
+    a single ``"error"`` column), or with ``as_frame=False`` a
+    ``RecommendationList`` / ``RecommendationError``.
+
+    With ``trace=True`` the per-stage timings and counters of this call are
+    attached to the result as ``trace`` (``attrs["trace"]``).
+
+    ``fusion_weights`` (e.g. ``{"semantic": 0.5, "lexical": 0.3}``, missing
+    components keep their build weight) and ``recency_weight`` re-fuse the
+    similarity row from its components for this request only.
+
+    With ``text_fallback=True`` a query that matches no title is treated as a
+    free-text description (see ``search_cb_recommendations``) and the result
+    carries ``search_mode == "text"``. The title match is then stricter
+    (``covers_query``): a description that contains a title is searched as
+    text.
+
+    With ``paginate=True`` the ranking continues up to ``CURSOR_MAX_RESULTS``
+    and is cached for ``CURSOR_TTL_SECONDS``; ``cursor`` is then an opaque
+    token for ``next_cb_recommendations`` (None when there is nothing more).
+
+    With ``hide_related=True`` sequels, prequels, adaptations and every other
+    title of the seed's franchise, however far down the chain, are left out
+    (needs the ``relation_graph.npz`` artifact, see ``cb_relations`` and
+    ``relations_available``).
+
+    ``diversity`` (0–1) trades relevance for variety: the results are picked
+    by maximal marginal relevance among the top ``DIVERSITY_POOL``
+    candidates, penalising titles similar to ones already picked. 0 or None
+    keeps the plain ranking.
+    """
+    with cb_metrics.tracing(trace) as request_trace:
+        with cb_metrics.stage("total"):
+            result = _get_cb_recommendations(anime_name, top_n, media_type, manga_format, fusion_weights,
+                                             recency_weight, text_fallback, paginate, hide_related, diversity)
+    return _finish(result, request_trace, as_frame)
+
+
+def _finish(result, request_trace, as_frame):
+    if request_trace is not None:
+        result.trace = request_trace.as_dict()
+    return to_dataframe(result) if as_frame else result
+
+
+# Catalogue columns read when building results
+_RESULT_COLUMNS = (
+    "id", "fetched_type", "title_romaji", "title_english", "title_native", "display_title", "description",
+    "genres", "tags", "studio", "studio_links", "averageScore", "popularity", "favourites", "source", "season",
+    "country", "duration", "relations", "format", "status", "coverImage", "bannerImage", "trailer_thumbnail",
+    "episodes", "chapters", "volumes", "start_year", "start_month", "start_day", "end_year", "end_month", "end_day",
+)
+
+
+def build_recommendations(anime_df, final_scores):
+    """
+    ``Recommendation`` per ranked ``(idx, sim)`` (trailer_id is filled in
+    separately). The ranked rows are taken from each column's array and
+    read column-wise, without a Series per row or an intermediate frame.
+    """
+    if not final_scores:
+        return []
+    positions = anime_df.index.get_indexer([i for i, _ in final_scores])
+    # Per-column take: a sub-frame take would first copy every result column of the catalogue
+    columns = {c: np.asarray(anime_df[c].array.take(positions)) for c in _RESULT_COLUMNS if c in anime_df.columns}
 
     recs = []
-    for i, sim in final_scores:
-        m = anime_df.loc[i].to_dict()
+    for pos, (_, sim) in enumerate(final_scores):
+        def value(col, default=None):
+            values = columns.get(col)
+            if values is None:
+                return default
+            v = values[pos]
+            return v.item() if isinstance(v, np.generic) else v
 
         # Clean & format
-        m["display_title"] = clean_text(m.get("display_title", "N/A"))
-        m["title_romaji"] = clean_text(m.get("title_romaji", "N/A"))
-        m["title_english"] = clean_text(m.get("title_english", "N/A"))
-        m["title_native"] = clean_text(m.get("title_native", "N/A"))
+        status = clean_text(value("status", "N/A"))
+        recs.append(Recommendation(
+            id=value("id"),
+            fetched_type=value("fetched_type"),
+            title_romaji=clean_text(value("title_romaji", "N/A")),
+            title_english=clean_text(value("title_english", "N/A")),
+            title_native=clean_text(value("title_native", "N/A")),
+            display_title=clean_text(value("display_title", "N/A")),
+            description=clean_text(value("description", "N/A")),
+            genres=value("genres"),
+            tags=value("tags"),
+            studio_links=safe_list(value("studio_links")),
+            averageScore=value("averageScore"),
+            popularity=value("popularity") or 0,
+            favourites=value("favourites") or 0,
+            source=clean_text(value("source", "N/A")),
+            season=clean_text(value("season", "N/A")),
+            country=value("country"),
+            duration=value("duration"),
+            relations=format_relations(clean_text(value("relations", ""))),
+            format=clean_text(value("format", "N/A")),
+            status=status,
+            coverImage=value("coverImage") or "",
+            bannerImage=value("bannerImage") or "",
+            trailer_thumbnail=value("trailer_thumbnail") or "",
+            chapters_display=format_chapters(value("chapters"), status.lower()),
+            volumes_display=format_volumes(value("volumes"), status.lower()),
+            studios=safe_list(value("studio")),
+            similarity_score=round(float(sim), 3),
+            start_date=format_date(value("start_year"), value("start_month"), value("start_day"), fallback="N/A"),
+            end_date=format_date(value("end_year"), value("end_month"), value("end_day"), fallback="Ongoing"),
+            episodes_display=format_episodes(value("episodes"), status.lower()),
+        ))
+    return recs
+
+
+def format_recommendation(anime_df, i, sim):
+    """Display-ready dict for catalogue row ``i`` (trailer_id is filled in separately)."""
+    return build_recommendations(anime_df, [(i, sim)])[0].to_dict()
+
+
+def _get_cb_recommendations(anime_name, top_n, media_type, manga_format, fusion_weights=None, recency_weight=None,
+                            text_fallback=False, paginate=False, hide_related=False, diversity=None):
+    ranked_size = CURSOR_MAX_RESULTS if paginate else None
+    ranked = _rank_recommendations(anime_name, top_n, media_type, manga_format, fusion_weights, recency_weight,
+                                   ranked_size, hide_related, diversity, strict=text_fallback)
+    search_mode = "title"
+    if ranked is None:
+        if not text_fallback:
+            return _no_match(anime_name)
+        ranked = _rank_text_search(anime_name, top_n, media_type, manga_format, ranked_size=ranked_size)
+        search_mode = "text"
+    if isinstance(ranked, RecommendationError):
+        return ranked
+    anime_df, final_scores = ranked
+    cursor = None
+    if paginate:
+        final_scores, cursor = _first_page(anime_df, final_scores, top_n)
+    return RecommendationList(_build_recommendations(anime_df, final_scores), search_mode=search_mode,
+                              paginated=paginate, cursor=cursor)
+
+
+def warm_ranking(anime_name, top_n=10, media_type=None, manga_format=None, model=None):
+    """
+    Rank a title query into ``model``'s result cache (default: the current
+    model) as a paginated ``get_cb_recommendations`` call would, without
+    formatting or trailer lookups. Returns the ``(AniList id, media type)``
+    pairs of the first page, for a trailer prefetch, or None when the query
+    cannot be ranked.
+    """
+    ranked = _rank_recommendations(anime_name, top_n, media_type, manga_format, ranked_size=CURSOR_MAX_RESULTS,
+                                   model=model)
+    if ranked is None or isinstance(ranked, RecommendationError):
+        return None
+    anime_df, final_scores = ranked
+    rows = anime_df.index.get_indexer([i for i, _ in final_scores[:top_n]])
+    return list(zip(anime_df["id"].to_numpy()[rows].tolist(), anime_df["fetched_type"].to_numpy()[rows].tolist()))
 
-        m["description"] = clean_text(m.get("description", "N/A"))
-        m["source"] = clean_text(m.get("source", "N/A"))
-        m["status"] = clean_text(m.get("status", "N/A"))
-        m["season"] = clean_text(m.get("season", "N/A"))
-        m["relations"] = format_relations(clean_text(m.get("relations", "")))
-        m["chapters_display"] = format_chapters(m.get("chapters"), m.get("status", "").lower())
-        m["volumes_display"] = format_volumes(m.get("volumes"), m.get("status", "").lower())
-        m["format"] = clean_text(m.get("format", "N/A"))
 
-        m["studio_links"] = safe_list(m.get("studio_links"))
-        m["studios"] = safe_list(m.get("studio"))
-        m["similarity_score"] = round(float(sim), 3)
+# -----------------------------
+# Free-Text Search
+# -----------------------------
+def search_cb_recommendations(query, top_n=10, media_type=None, manga_format=None, rerank=True, trace=False,
+                              as_frame=True):
+    """
+    Titles matching a free-text description ("dark fantasy revenge with a
+    time loop") by TF-IDF cosine similarity against the catalogue text.
 
-        m["start_date"] = format_date(m.get("start_year"), m.get("start_month"), m.get("start_day"), fallback="N/A")
-        m["end_date"] = format_date(m.get("end_year"), m.get("end_month"), m.get("end_day"), fallback="Ongoing")
+    With ``rerank=True`` the genre/tag rerank is applied with the best
+    text match standing in for the seed title. ``as_frame`` works as in
+    ``get_cb_recommendations``.
+    """
+    with cb_metrics.tracing(trace) as request_trace:
+        with cb_metrics.stage("total"):
+            ranked = _rank_text_search(query, top_n, media_type, manga_format, rerank)
+            result = ranked if isinstance(ranked, RecommendationError) else RecommendationList(_build_recommendations(*ranked))
+    return _finish(result, request_trace, as_frame)
 
-        m["episodes_display"] = format_episodes(m.get("episodes"), m.get("status").lower())
 
-        m["popularity"] = m.get("popularity") or 0
-        m["favourites"] = m.get("favourites") or 0
+def _build_recommendations(anime_df, final_scores):
+    """Formatted results with trailer ids for a ranked ``(idx, sim)`` list."""
+    with cb_metrics.stage("format"):
+        recs = build_recommendations(anime_df, final_scores)
 
-        m["trailer_thumbnail"] = m.get("trailer_thumbnail") or ""
-        m["coverImage"] = m.get("coverImage") or ""
-        m["bannerImage"] = m.get("bannerImage") or ""
+    # Fetch trailer IDs (with caching)
+    with cb_metrics.stage("trailers"):
+        for m in recs:
+            m.trailer_id = get_trailer_id(m.id, m.fetched_type)
 
-        # Fetch trailer ID (with caching)
-        m["trailer_id"] = get_trailer_id(m.get("id"), m.get("fetched_type"))
+    return recs
 
-        recs.append(m)
 
-    return pd.DataFrame(recs)
\ No newline at end of file
+# -----------------------------
+# Streaming Recommendations
+# -----------------------------
+TRAILER_WORKERS = 8
+
+
+def stream_cb_recommendations(anime_name, top_n=10, media_type=None, manga_format=None,
+                              fusion_weights=None, recency_weight=None, text_fallback=False, paginate=False,
+                              hide_related=False, diversity=None):
+    """
+    Progressive variant of ``get_cb_recommendations`` for the UI.
+
+    Yields event dicts as soon as they are available:
+
+    - ``{"type": "error", "error": msg, "code": code}`` if the query cannot be served
+    - ``{"type": "ranked", "count": n, "mode": "title" | "text", "cursor": c}`` once ranking
+      has finished (``cursor`` is None unless ``paginate=True`` and more results exist)
+    - ``{"type": "card", "rank": k, "item": m}`` per result (a ``Recommendation``, ``trailer_id`` None)
+    - ``{"type": "trailer", "rank": k, "trailer_id": t}`` as each trailer lookup completes
+
+    Trailer lookups run on a thread pool while the cards are being consumed.
+    ``text_fallback``, ``paginate``, ``hide_related`` and ``diversity`` work
+    as in ``get_cb_recommendations``.
+    """
+    ranked_size = CURSOR_MAX_RESULTS if paginate else None
+    ranked = _rank_recommendations(anime_name, top_n, media_type, manga_format, fusion_weights, recency_weight,
+                                   ranked_size, hide_related, diversity, strict=text_fallback)
+    mode = "title"
+    if ranked is None:
+        ranked = (_rank_text_search(anime_name, top_n, media_type, manga_format, ranked_size=ranked_size)
+                  if text_fallback else _no_match(anime_name))
+        mode = "text"
+    if isinstance(ranked, RecommendationError):
+        yield {"type": "error", "error": ranked.message, "code": ranked.code}
+        return
+    anime_df, final_scores = ranked
+    cursor = None
+    if paginate:
+        final_scores, cursor = _first_page(anime_df, final_scores, top_n)
+    yield {"type": "ranked", "count": len(final_scores), "mode": mode, "cursor": cursor}
+
+    with cb_metrics.stage("format"):
+        items = build_recommendations(anime_df, final_scores)
+
+    executor = ThreadPoolExecutor(max_workers=TRAILER_WORKERS)
+    try:
+        pending = {}
+        for rank, m in enumerate(items):
+            # Copy the context so the lookup counts towards the caller's trace
+            future = executor.submit(contextvars.copy_context().run, get_trailer_id, m.id, m.fetched_type)
+            pending[future] = rank
+            yield {"type": "card", "rank": rank, "item": m}
+
+        for future in as_completed(pending):
+            yield {"type": "trailer", "rank": pending[future], "trailer_id": future.result()}
+    finally:
+        # Don't hold the caller up on lookups nobody is waiting for anymore
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# -----------------------------
+# Pagination
+# -----------------------------
+CURSOR_MAX_RESULTS = 200
+CURSOR_TTL_SECONDS = 600
+CURSOR_CACHE_SIZE = 256
+
+# token -> (expires_at, anime_df, [(idx, sim), ...]); LRU on top of the TTL
+_ranked_cache = OrderedDict()
+_ranked_cache_lock = threading.Lock()
+
+
+def _encode_cursor(token, offset, page_size):
+    return base64.urlsafe_b64encode(f"{token}:{offset}:{page_size}".encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        token, offset, page_size = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit(":", 2)
+        return token, int(offset), int(page_size)
+    except (ValueError, AttributeError, UnicodeDecodeError):
+        return None
+
+
+def _first_page(anime_df, final_scores, top_n):
+    """Cache the full ranked list; returns the first page and a cursor for the next one (or None)."""
+    if len(final_scores) <= top_n:
+        return final_scores, None
+    token = secrets.token_urlsafe(12)
+    now = time.monotonic()
+    with _ranked_cache_lock:
+        for key in [k for k, (expires_at, _, _) in _ranked_cache.items() if expires_at <= now]:
+            del _ranked_cache[key]
+        _ranked_cache[token] = (now + CURSOR_TTL_SECONDS, anime_df, final_scores)
+        if len(_ranked_cache) > CURSOR_CACHE_SIZE:
+            _ranked_cache.popitem(last=False)
+    return final_scores[:top_n], _encode_cursor(token, top_n, top_n)
+
+
+def _cached_ranking(token):
+    with _ranked_cache_lock:
+        entry = _ranked_cache.get(token)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del _ranked_cache[token]
+            return None
+        _ranked_cache.move_to_end(token)
+        return entry[1], entry[2]
+
+
+def next_cb_recommendations(cursor, page_size=None, trace=False, as_frame=True):
+    """
+    Next page of a paginated ``get_cb_recommendations`` call. Only the
+    page's rows are formatted and enriched; nothing is re-ranked.
+    ``cursor`` on the result points at the page after this one (None at the end).
+    """
+    with cb_metrics.tracing(trace) as request_trace:
+        with cb_metrics.stage("total"):
+            result = _next_cb_recommendations(cursor, page_size)
+    return _finish(result, request_trace, as_frame)
+
+
+def _next_cb_recommendations(cursor, page_size):
+    decoded = _decode_cursor(cursor)
+    if decoded is None:
+        return RecommendationError("invalid_cursor", "Invalid cursor.")
+    token, offset, default_size = decoded
+    cached = _cached_ranking(token)
+    if cached is None:
+        cb_metrics.incr("cursor_expired")
+        return RecommendationError("cursor_expired", "These results have expired, please search again.")
+    anime_df, final_scores = cached
+    page_size = page_size or default_size
+    end = offset + page_size
+    return RecommendationList(
+        _build_recommendations(anime_df, final_scores[offset:end]), paginated=True, offset=offset,
+        cursor=_encode_cursor(token, end, page_size) if end < len(final_scores) else None,
+    )
+
+
+# -----------------------------
+# Multi-Seed Recommendations
+# -----------------------------
+def get_multi_seed_recommendations(seeds, top_n=10, weights=None, negative_seeds=None, negative_weight=0.5,
+                                   media_type=None, manga_format=None, trace=False, fusion_weights=None,
+                                   recency_weight=None, as_frame=True):
+    """
+    "Because you liked these" recommendations for several seed titles.
+
+    The similarity rows of all resolved seeds are combined in one weighted
+    sum: positive seeds are averaged with ``weights`` (default equal),
+    negative seeds are averaged and subtracted with ``negative_weight``.
+    Seeds are excluded from the results. Titles that cannot be resolved are
+    skipped and listed in ``unresolved_seeds``. Weights that do not add up
+    to a positive value are rejected as ``invalid_argument``. ``fusion_weights`` /
+    ``recency_weight`` and ``as_frame`` work as in ``get_cb_recommendations``.
+    """
+    with cb_metrics.tracing(trace) as request_trace:
+        with cb_metrics.stage("total"):
+            result = _get_multi_seed_recommendations(seeds, top_n, weights, negative_seeds or [], negative_weight,
+                                                     media_type, manga_format, fusion_weights, recency_weight)
+    return _finish(result, request_trace, as_frame)
+
+
+def _get_multi_seed_recommendations(seeds, top_n, weights, negative_seeds, negative_weight, media_type, manga_format,
+                                    fusion_weights=None, recency_weight=None):
+    if isinstance(seeds, str):
+        seeds = [seeds]
+    if weights is None:
+        weights = [1.0] * len(seeds)
+    if not seeds:
+        return RecommendationError("invalid_argument", "At least one seed title is required.")
+    if len(weights) != len(seeds):
+        return RecommendationError("invalid_argument", "weights must have one entry per seed.")
+    if sum(weights) <= 0:
+        return RecommendationError("invalid_argument", "Seed weights must add up to a positive value.")
+
+    with cb_metrics.stage("load_cb_model"):
+        model = get_cb_model()
+
+    with cb_metrics.stage("filter"):
+        keep = model.filters.mask(media_type, manga_format)
+    if not keep.any():
+        return _empty_filter()
+
+    with cb_metrics.stage("build_aliases"):
+        alias_map, choices = model.alias_lookup()
+
+    # Seeds resolve against the whole catalogue, the filter only applies to the results
+    unresolved = []
+
+    def resolve_all(titles, title_weights):
+        rows, row_weights = [], []
+        for title, w in zip(titles, title_weights):
+            idx = resolve_title(title, alias_map, choices)
+            if idx is None:
+                unresolved.append(title)
+            else:
+                rows.append(idx)
+                row_weights.append(float(w))
+        return rows, row_weights
+
+    pos_rows, pos_weights = resolve_all(seeds, weights)
+    neg_rows, neg_weights = resolve_all(negative_seeds, [1.0] * len(negative_seeds))
+    if not pos_rows or sum(pos_weights) <= 0:
+        return RecommendationError("no_match", f"No close match found for {', '.join(map(repr, seeds))}.")
+
+    with cb_metrics.stage("sort"):
+        # One (seeds × N) block and a single weighted reduction over it
+        seed_rows = np.asarray(pos_rows + neg_rows)
+        try:
+            rows = model.similarity_rows(seed_rows, fusion_weights, recency_weight)
+        except (ValueError, FileNotFoundError) as e:
+            return _request_error(e)
+        coef = np.asarray(pos_weights) / sum(pos_weights)
+        if neg_rows:
+            coef = np.concatenate([coef, -negative_weight * np.asarray(neg_weights) / sum(neg_weights)])
+        scores = coef @ rows
+        scores[~keep] = -np.inf
+        scores[seed_rows] = -np.inf
+        candidates = _top_candidates(scores, top_n + 19)
+
+    with cb_metrics.stage("rerank"):
+        # Genres/tags of every positive seed count as matches
+        picked, picked_sims = rerank_block(model, np.asarray(pos_rows)[None, :], candidates[None, :],
+                                           scores[candidates][None, :], top_n)
+        final_scores = _final_scores(picked[0], picked_sims[0])
+
+    return RecommendationList(_build_recommendations(model.anime_df, final_scores), unresolved_seeds=unresolved)
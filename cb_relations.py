@@ -0,0 +1,208 @@
+"""
+AniList relation edges as a typed adjacency graph over the catalogue.
+
+The catalogue only keeps relations as flattened text ("ADAPTATION Shingeki
+no Kyojin SEQUEL ..."), which is fine for display but cannot be joined back
+to titles. similarity.ipynb therefore also stores the edges returned by
+``fetch_media`` in ``relation_graph.npz``, in CSR layout:
+
+- ``indptr`` (N + 1): the edges of catalogue row ``r`` are
+  ``indptr[r]:indptr[r + 1]``
+- ``targets``: AniList id of the related title, also for titles outside
+  the catalogue
+- ``target_rows``: catalogue row of the target, -1 when it is not in the
+  catalogue
+- ``target_types`` / ``relations``: int8 codes into ``MEDIA_TYPES`` /
+  ``RELATION_TYPES``
+
+Looking up the relations of a title is a slice, i.e. O(degree), with no
+string parsing per request. Franchises (connected components over
+``FRANCHISE_RELATIONS``, also through titles outside the catalogue) are
+computed once per graph and stored grouped the same way, so the whole
+franchise of a title is a slice too.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+# AniList MediaRelation values
+RELATION_TYPES = ("ADAPTATION", "PREQUEL", "SEQUEL", "PARENT", "SIDE_STORY", "CHARACTER", "SUMMARY", "ALTERNATIVE",
+                  "SPIN_OFF", "OTHER", "SOURCE", "COMPILATION", "CONTAINS")
+MEDIA_TYPES = ("ANIME", "MANGA")
+# Relations that make two titles the same franchise; CHARACTER and OTHER only share a cast member or a mention
+FRANCHISE_RELATIONS = ("ADAPTATION", "PREQUEL", "SEQUEL", "PARENT", "SIDE_STORY", "SUMMARY", "ALTERNATIVE",
+                       "SPIN_OFF", "SOURCE", "COMPILATION", "CONTAINS")
+
+_RELATION_CODES = {name: code for code, name in enumerate(RELATION_TYPES)}
+_MEDIA_CODES = {name: code for code, name in enumerate(MEDIA_TYPES)}
+
+
+@dataclass(slots=True)
+class RelatedTitle:
+    """One edge: ``id`` is related to the queried title as ``relation``; ``row`` is None outside the catalogue."""
+
+    id: int
+    media_type: str
+    relation: str
+    row: int = None
+
+
+class RelationGraph:
+    """Typed relation edges of the catalogue, one CSR row per title."""
+
+    def __init__(self, ids, types, indptr, targets, target_types, relations):
+        # Catalogue order, as in the pickled DataFrame
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.types = np.asarray(types, dtype=np.int8)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int64)
+        self.target_types = np.asarray(target_types, dtype=np.int8)
+        self.relations = np.asarray(relations, dtype=np.int8)
+        self._order = np.argsort(self.ids, kind="stable")
+        self.target_rows = self.rows_of(self.targets)
+        self.franchise, self._franchise_rows, self._franchise_ptr = self._franchises()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def n_edges(self):
+        return len(self.targets)
+
+    def _franchises(self):
+        """
+        Franchise label per catalogue row, plus the rows grouped by label
+        (CSR-like: the rows of label ``f`` are ``rows[ptr[f]:ptr[f + 1]]``).
+        Targets outside the catalogue are extra nodes, so two seasons linked
+        only through a missing title still share a franchise.
+        """
+        n = len(self.ids)
+        if not n:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+        keep = np.isin(self.relations, self.relation_codes(FRANCHISE_RELATIONS))
+        sources = np.repeat(np.arange(n), np.diff(self.indptr))[keep]
+        outside, outside_nodes = np.unique(self.targets[keep], return_inverse=True)
+        nodes = np.where(self.target_rows[keep] >= 0, self.target_rows[keep], n + outside_nodes)
+        size = n + len(outside)
+        graph = sparse.csr_matrix((np.ones(len(sources), dtype=np.int8), (sources, nodes)), shape=(size, size))
+        labels = connected_components(graph, directed=False)[1][:n]
+        rows = np.argsort(labels, kind="stable")
+        ptr = np.searchsorted(labels[rows], np.arange(labels.max() + 2))
+        return labels, rows, ptr
+
+    @staticmethod
+    def relation_codes(relations):
+        """int8 codes of relation names; raises ValueError on an unknown one."""
+        unknown = [r for r in relations if r not in _RELATION_CODES]
+        if unknown:
+            raise ValueError(f"Unknown relation type {unknown[0]!r}, expected one of {', '.join(RELATION_TYPES)}.")
+        return np.asarray([_RELATION_CODES[r] for r in relations], dtype=np.int8)
+
+    @classmethod
+    def from_media(cls, media, catalogue):
+        """
+        Graph of the ``relations.edges`` of ``media`` (the raw
+        ``fetch_media`` list) for the titles of ``catalogue`` (a DataFrame
+        with ``id`` and ``fetched_type``), in catalogue order. Edges of
+        unknown type are skipped and duplicates are kept once.
+        """
+        edges_by_id = {}
+        for m in media:
+            if not m or m.get("id") is None:
+                continue
+            edges = edges_by_id.setdefault(int(m["id"]), {})
+            for e in (m.get("relations") or {}).get("edges") or []:
+                node = e.get("node") or {}
+                relation, media_type = e.get("relationType"), node.get("type")
+                if node.get("id") is None or relation not in _RELATION_CODES or media_type not in _MEDIA_CODES:
+                    continue
+                edges[(int(node["id"]), relation)] = media_type
+
+        ids = catalogue["id"].astype("int64").tolist()
+        indptr, targets, target_types, relations = [0], [], [], []
+        for anilist_id in ids:
+            for (target, relation), media_type in edges_by_id.get(anilist_id, {}).items():
+                targets.append(target)
+                target_types.append(_MEDIA_CODES[media_type])
+                relations.append(_RELATION_CODES[relation])
+            indptr.append(len(targets))
+        types = [_MEDIA_CODES.get(str(t).upper(), -1) for t in catalogue["fetched_type"].tolist()]
+        return cls(ids, types, indptr, targets, target_types, relations)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            data = np.load(path, allow_pickle=False)
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Relation lookups need {path}; rebuild the artifacts with similarity.ipynb.") from e
+        with data:
+            return cls(data["ids"], data["types"], data["indptr"], data["targets"], data["target_types"],
+                       data["relations"])
+
+    def save(self, path):
+        np.savez(path, ids=self.ids, types=self.types, indptr=self.indptr, targets=self.targets,
+                 target_types=self.target_types, relations=self.relations)
+
+    # -----------------------------
+    # Lookups
+    # -----------------------------
+    def rows_of(self, anilist_ids):
+        """Catalogue rows of ``anilist_ids`` (array), -1 for ids outside the catalogue."""
+        anilist_ids = np.asarray(anilist_ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(anilist_ids.shape, -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.ids, anilist_ids, sorter=self._order), len(self.ids) - 1)
+        rows = self._order[pos]
+        return np.where(self.ids[rows] == anilist_ids, rows, -1)
+
+    def edge_slice(self, row, relations=None, media_type=None, in_catalogue=False):
+        """
+        Positions of the edges of catalogue ``row`` (an int array into
+        ``targets`` and friends), optionally restricted to relation names,
+        a target media type and targets in the catalogue.
+        """
+        start, end = self.indptr[row], self.indptr[row + 1]
+        keep = np.ones(end - start, dtype=bool)
+        if relations is not None:
+            keep &= np.isin(self.relations[start:end], self.relation_codes(relations))
+        if media_type is not None:
+            keep &= self.target_types[start:end] == _MEDIA_CODES.get(media_type.upper(), -1)
+        if in_catalogue:
+            keep &= self.target_rows[start:end] >= 0
+        return start + np.flatnonzero(keep)
+
+    def related_rows(self, row, relations=FRANCHISE_RELATIONS):
+        """Catalogue rows directly related to ``row`` (unique, ascending)."""
+        return np.unique(self.target_rows[self.edge_slice(row, relations, in_catalogue=True)])
+
+    def franchise_rows(self, row):
+        """Catalogue rows of ``row``'s franchise, ``row`` itself excluded (ascending)."""
+        label = self.franchise[row]
+        rows = self._franchise_rows[self._franchise_ptr[label]:self._franchise_ptr[label + 1]]
+        return rows[rows != row]
+
+    def related(self, anilist_id, relations=None, media_type=None):
+        """``RelatedTitle`` list for an AniList id; empty when the id is not in the catalogue."""
+        row = int(self.rows_of([anilist_id])[0])
+        if row < 0:
+            return []
+        edges = self.edge_slice(row, relations, media_type)
+        return [RelatedTitle(int(self.targets[k]), MEDIA_TYPES[self.target_types[k]], RELATION_TYPES[self.relations[k]],
+                             int(self.target_rows[k]) if self.target_rows[k] >= 0 else None)
+                for k in edges.tolist()]
+
+    def adaptations(self, anilist_id):
+        """Adaptations and source material in the other medium (anime <-> manga)."""
+        row = int(self.rows_of([anilist_id])[0])
+        if row < 0 or self.types[row] < 0:
+            return []
+        other = MEDIA_TYPES[1 - self.types[row]]
+        return self.related(anilist_id, ("ADAPTATION", "SOURCE"), media_type=other)
+
+    def sequels(self, anilist_id):
+        return self.related(anilist_id, ("SEQUEL",))
+
+    def prequels(self, anilist_id):
+        return self.related(anilist_id, ("PREQUEL",))
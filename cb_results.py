@@ -0,0 +1,122 @@
+"""
+Typed recommendation results.
+
+``Recommendation`` carries only the fields the UI and the API read, in
+``__slots__``, instead of a dict of every catalogue column plus the derived
+display fields. It also supports ``item["field"]`` / ``item.get("field")``,
+so code written against the old dicts keeps working. A call returns a
+``RecommendationList`` or a ``RecommendationError``; ``to_dataframe`` turns
+either into the DataFrame shape the ``get_*`` functions have always returned.
+"""
+from dataclasses import dataclass, fields
+from typing import Optional
+
+import pandas as pd
+
+
+@dataclass(slots=True)
+class Recommendation:
+    id: int
+    fetched_type: str
+    title_romaji: str
+    title_english: str
+    title_native: str
+    display_title: str
+    description: str
+    genres: str
+    tags: str
+    studio_links: list
+    averageScore: float
+    popularity: int
+    favourites: int
+    source: str
+    season: str
+    country: str
+    duration: float
+    relations: str
+    format: str
+    status: str
+    coverImage: str
+    bannerImage: str
+    trailer_thumbnail: str
+    chapters_display: str
+    volumes_display: str
+    studios: list
+    similarity_score: float
+    start_date: str
+    end_date: str
+    episodes_display: str
+    trailer_id: Optional[str] = None
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in FIELD_NAMES}
+
+
+FIELD_NAMES = tuple(f.name for f in fields(Recommendation))
+
+
+@dataclass(slots=True)
+class RecommendationList:
+    """Ranked results plus request metadata; iterates over ``Recommendation`` items."""
+
+    items: list
+    search_mode: Optional[str] = None
+    paginated: bool = False
+    cursor: Optional[str] = None
+    offset: Optional[int] = None
+    unresolved_seeds: Optional[list] = None
+    trace: Optional[dict] = None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+
+@dataclass(slots=True)
+class RecommendationError:
+    """
+    A request that could not be served.
+
+    ``code`` is one of ``no_match``, ``empty_filter``, ``invalid_argument``,
+    ``missing_artifact``, ``invalid_cursor`` or ``cursor_expired``.
+    """
+
+    code: str
+    message: str
+    trace: Optional[dict] = None
+
+    def __str__(self):
+        return self.message
+
+
+def to_dataframe(result):
+    """
+    DataFrame view of a ``RecommendationList`` (one row per item, metadata in
+    ``attrs``) or of a ``RecommendationError`` (a single ``"error"`` column).
+    """
+    if isinstance(result, RecommendationError):
+        recs = pd.DataFrame([{"error": result.message}])
+        attrs = {"error_code": result.code, "trace": result.trace}
+    else:
+        recs = pd.DataFrame([item.to_dict() for item in result.items], columns=list(FIELD_NAMES))
+        attrs = {"search_mode": result.search_mode, "offset": result.offset,
+                 "unresolved_seeds": result.unresolved_seeds, "trace": result.trace}
+    recs.attrs.update({k: v for k, v in attrs.items() if v is not None})
+    if isinstance(result, RecommendationList) and result.paginated:
+        # None means there is no next page
+        recs.attrs["cursor"] = result.cursor
+    return recs
@@ -0,0 +1,67 @@
+"""
+Free-text retrieval over the catalogue with the shipped TF-IDF vectorizer.
+
+The catalogue's TF-IDF rows are kept transposed (term -> titles), i.e. as an
+inverted index, so scoring a query is one sparse vector × matrix product that
+only touches the postings of the query's terms. Rows are L2-normalised by the
+vectorizer, so the scores are cosine similarities in 0–1.
+
+The matrix is persisted next to the vectorizer (``tfidf_matrix.npz``,
+written by similarity.ipynb, like ``fusion_components.npz`` and
+``relation_graph.npz``). Without it the index is rebuilt from
+``combined_text`` at load.
+"""
+import logging
+import os
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+
+class TextIndex:
+    """Inverted TF-IDF index of the catalogue."""
+
+    def __init__(self, vectorizer, matrix):
+        self.vectorizer = vectorizer
+        # (V, N) CSR: row v lists the titles containing term v
+        self.postings = sparse.csr_matrix(matrix, dtype=np.float64).T.tocsr()
+        self.n = matrix.shape[0]
+
+    def __len__(self):
+        return self.n
+
+    @classmethod
+    def build(cls, vectorizer, texts):
+        return cls(vectorizer, vectorizer.transform([t if isinstance(t, str) else "" for t in texts]))
+
+    @classmethod
+    def load(cls, vectorizer, path, texts=None):
+        """Index from the persisted matrix, or built from ``texts`` when the file is missing."""
+        if os.path.exists(path):
+            return cls(vectorizer, sparse.load_npz(path))
+        if texts is None:
+            raise FileNotFoundError(f"Free-text search needs {path}; rebuild the artifacts with similarity.ipynb.")
+        logger.warning("%s not found, building the TF-IDF matrix from combined_text", path)
+        return cls.build(vectorizer, texts)
+
+    def save(self, path):
+        sparse.save_npz(path, self.postings.T.tocsr())
+
+    def search(self, query, keep=None):
+        """
+        ``(rows, scores)`` of every title sharing at least one term with
+        ``query``, rows in catalogue order; ``keep`` is an optional boolean
+        row mask.
+        """
+        q = self.vectorizer.transform([query])
+        if q.nnz == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        # Densifying the (1, N) product is cheaper than sorting its sparse indices
+        scores = (q @ self.postings).toarray().ravel()
+        hit = scores > 0
+        if keep is not None:
+            hit &= keep
+        rows = np.flatnonzero(hit)
+        return rows, scores[rows]
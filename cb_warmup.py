@@ -0,0 +1,131 @@
+"""
+Warm the caches after a deploy, so the first searches for top titles are not
+the slow ones.
+
+    python cb_warmup.py --top 200 --budget 60
+    python cb_warmup.py --query-log queries.log --budget 30
+
+Loads the model, ranks the most popular titles (or the most frequent queries
+of a replayed log, one query per line) into the result cache and prefetches
+the trailer ids of their first page in bulk, within the AniList rate limit
+(``cb_model.anilist_limiter``). Everything stops at the time budget; the
+trailers left over are fetched by later requests. ``start_warmup()`` runs
+the same routine on a daemon thread, so the app is ready while it runs; a
+CLI run fills the shared trailer cache file.
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from collections import Counter
+
+import cb_model
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TOP_TITLES = 200
+WARMUP_BUDGET_SECONDS = 60.0
+# Matches the defaults of the search form in Home.py
+WARMUP_TOP_N = 15
+# Trailer lookups in flight; the AniList rate limit is shared with live requests, so keep their wait short
+WARMUP_TRAILER_WORKERS = 2
+
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+
+
+def popular_seeds(model, limit):
+    """``(query, media_type)`` for the ``limit`` most popular titles, searched under their own media type."""
+    df = model.anime_df
+    top = df["popularity"].fillna(0).to_numpy().argsort(kind="stable")[::-1][:limit]
+    titles, types = df["display_title"].to_numpy(), df["fetched_type"].to_numpy()
+    return [(str(titles[i]), str(types[i]).upper()) for i in top if isinstance(titles[i], str) and titles[i]]
+
+
+def load_query_log(path, limit):
+    """The ``limit`` most frequent queries of a log with one query per line."""
+    with open(path, encoding="utf-8") as f:
+        counts = Counter(line.strip() for line in f if line.strip())
+    return [query for query, _ in counts.most_common(limit)]
+
+
+def warm_up(queries=None, top=WARMUP_TOP_TITLES, budget=WARMUP_BUDGET_SECONDS, top_n=WARMUP_TOP_N,
+            media_types=("ANIME", "MANGA"), prefetch_trailers=True, workers=WARMUP_TRAILER_WORKERS, model=None):
+    """
+    Rank ``queries`` (default: the ``top`` most popular titles) into the
+    result cache, then prefetch trailer ids for their first pages until
+    ``budget`` seconds have passed. Logged queries are warmed for every
+    media type in ``media_types``; popular titles for their own. ``model``
+    defaults to the current one; a hot reload passes the incoming model.
+    Returns a stats dict.
+    """
+    start = time.monotonic()
+    deadline = start + budget
+    stats = {"seeds": 0, "ranked": 0, "unmatched": 0, "trailers_fetched": 0, "timed_out": False}
+
+    model = model if model is not None else cb_model.get_cb_model()
+    stats["load_s"] = round(time.monotonic() - start, 3)
+    if queries is None:
+        seeds = popular_seeds(model, top)
+    else:
+        seeds = [(query, media_type) for query in queries for media_type in media_types]
+    stats["seeds"] = len(seeds)
+
+    trailer_items = []
+    for query, media_type in seeds:
+        if time.monotonic() >= deadline:
+            stats["timed_out"] = True
+            break
+        # Same ranking as a paginated UI search, so its first page comes out of the cache
+        first_page = cb_model.warm_ranking(query, top_n, media_type, model=model)
+        if first_page is None:
+            stats["unmatched"] += 1
+            continue
+        stats["ranked"] += 1
+        trailer_items += first_page
+    stats["rank_s"] = round(time.monotonic() - start - stats["load_s"], 3)
+
+    if prefetch_trailers and time.monotonic() < deadline:
+        stats["trailers_fetched"] = cb_model.prefetch_trailer_ids(trailer_items, workers, deadline)
+    stats["timed_out"] = stats["timed_out"] or time.monotonic() >= deadline
+    stats["seconds"] = round(time.monotonic() - start, 3)
+    logger.info("Warm-up: %s/%s seeds ranked, %s trailer lookups in %.1fs%s", stats["ranked"], stats["seeds"],
+                stats["trailers_fetched"], stats["seconds"], " (budget reached)" if stats["timed_out"] else "")
+    return stats
+
+
+def start_warmup(**kwargs):
+    """Run ``warm_up`` once per process on a daemon thread; returns the thread."""
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            def run():
+                try:
+                    warm_up(**kwargs)
+                except Exception:
+                    logger.exception("Warm-up failed")
+
+            _warmup_thread = threading.Thread(target=run, name="cb-warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=WARMUP_TOP_TITLES, help="number of titles or logged queries")
+    parser.add_argument("--query-log", default=None, help="replay the most frequent queries of this file")
+    parser.add_argument("--budget", type=float, default=WARMUP_BUDGET_SECONDS, help="time budget in seconds")
+    parser.add_argument("--top-n", type=int, default=WARMUP_TOP_N)
+    parser.add_argument("--no-trailers", action="store_true", help="skip the trailer prefetch (network)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    queries = load_query_log(args.query_log, args.top) if args.query_log else None
+    stats = warm_up(queries, top=args.top, budget=args.budget, top_n=args.top_n,
+                    prefetch_trailers=not args.no_trailers)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()